@@ -0,0 +1,355 @@
+"""Async JSON API for the bucket calculation.
+
+A plain ASGI application, run it with any ASGI server, e.g.:
+
+    uvicorn api_server:app --host 0.0.0.0 --port 8000
+
+Endpoints (all bodies are JSON, field names as in the app's user_data):
+
+    POST /swl          make, model, cwt, shoe_width, reach, boom_length, arm_length
+    POST /bucket       the /swl fields + material_density, quick_hitch_weight [, select_bhc]
+    POST /comparison   the /bucket fields + current_bucket_size, current_bucket_weight,
+                       dump_truck_payload, machine_swings_per_minute
+                       [, dump_truck_heaped, truck_brand, truck_model, tables]
+    POST /pdf          the /comparison fields; starts a PDF job and answers 202
+    POST /sweep        the /comparison fields + grid: {parameter: [values], ...} over
+                       material_density, machine_swings_per_minute, quick_hitch_weight, reach
+    GET  /pdf/<id>     job status;  GET /pdf/<id>.pdf  the finished report
+    GET  /health
+
+Missing, non-numeric or out-of-range inputs get a 400; a configuration
+with no SWL entry, or no bucket within it, gets a 422 with an ``error``.
+
+Concurrent requests are micro-batched: requests arriving within
+BUCKET_API_BATCH_DELAY seconds (or up to BUCKET_API_BATCH_SIZE of them)
+are evaluated together, with one vectorised bucket selection over the
+catalogue for the whole batch. PDFs render on a thread pool.
+
+With several workers (``--workers N``) set BUCKET_SHARED_CATALOGUE so
+they all map one published catalogue instead of each parsing the CSVs.
+Edited CSVs are picked up without a restart (catalogue_manager.py); every
+result carries the ``catalogue_version`` it was calculated from.
+"""
+
+import asyncio
+import json
+import math
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from bucket_engine import SWEEP_PARAMETERS
+from catalogue_manager import CatalogueManager
+from pdf_report import render_report
+from report_tables import build_comparison_data
+from request_log import RequestLog, json_default
+from tracing import span
+from user_input import (
+    BUCKET_FIELDS, COMPARISON_FIELDS, POSITIVE_FIELDS, SWL_FIELDS, BadRequest, clean_value, parse_select_bhc,
+    parse_user_data
+)
+from warmup import warm_up
+
+SWL_CSV = os.environ.get('BUCKET_SWL_CSV', 'excavator_swl.csv')
+BUCKET_CSV = os.environ.get('BUCKET_BUCKET_CSV', 'bucket_data.csv')
+BHC_BUCKET_CSV = os.environ.get('BUCKET_BHC_BUCKET_CSV', 'bhc_bucket_data.csv')
+DUMP_TRUCK_CSV = os.environ.get('BUCKET_DUMP_TRUCK_CSV', 'dump_trucks.csv')
+
+BATCH_SIZE = int(os.environ.get('BUCKET_API_BATCH_SIZE', 256))
+BATCH_DELAY = float(os.environ.get('BUCKET_API_BATCH_DELAY', 0.002))
+PDF_WORKERS = int(os.environ.get('BUCKET_API_PDF_WORKERS', 4))
+PDF_JOB_TTL = float(os.environ.get('BUCKET_API_PDF_JOB_TTL', 600))
+PDF_MAX_JOBS = int(os.environ.get('BUCKET_API_PDF_MAX_JOBS', 256))
+SWEEP_MAX_POINTS = int(os.environ.get('BUCKET_API_SWEEP_MAX_POINTS', 20000))
+MAX_BODY_BYTES = 64 * 1024
+
+
+def parse_grid(body):
+    """The sweep grid from a request body as {parameter: [floats]}."""
+    grid = body.get('grid')
+    if not isinstance(grid, dict) or not grid:
+        raise BadRequest('grid must be an object of {parameter: [values]}')
+    unknown = sorted(set(grid) - set(SWEEP_PARAMETERS))
+    if unknown:
+        raise BadRequest(f"can't sweep {', '.join(unknown)}; choose from {', '.join(SWEEP_PARAMETERS)}")
+    points = 1
+    parsed = {}
+    for name, values in grid.items():
+        if not isinstance(values, list) or not values:
+            raise BadRequest(f'grid.{name} must be a non-empty list of numbers')
+        try:
+            parsed[name] = [float(value) for value in values]
+        except (TypeError, ValueError):
+            raise BadRequest(f'grid.{name} must be a non-empty list of numbers')
+        if not all(math.isfinite(value) for value in parsed[name]):
+            raise BadRequest(f'grid.{name} must only hold finite numbers')
+        if name in POSITIVE_FIELDS and min(parsed[name]) <= 0:
+            raise BadRequest(f'grid.{name} must only hold numbers greater than zero')
+        points *= len(values)
+    if points > SWEEP_MAX_POINTS:
+        raise BadRequest(f'grid has {points} points, the limit is {SWEEP_MAX_POINTS}')
+    return parsed
+
+
+class MicroBatcher:
+    """Collects concurrent calculation requests and evaluates them as one batch.
+
+    ``catalogues`` is a CatalogueManager; each batch runs on the engine that
+    is current when the batch starts.
+    """
+
+    def __init__(self, catalogues, max_batch=BATCH_SIZE, max_delay=BATCH_DELAY):
+        self.catalogues = catalogues
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer = None
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, user_data, select_bhc, stage):
+        """Queue one request; ``stage`` is 'swl', 'bucket' or 'comparison'."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((user_data, select_bhc, stage, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        try:
+            with span('api_batch', size=len(batch)):
+                results = self.evaluate(batch)
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (*_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def evaluate(self, batch):
+        engine = self.catalogues.engine
+        results = [{'swl': clean_value(engine.find_matching_swl(user_data)), 'catalogue_version': engine.version}
+                   for user_data, *_ in batch]
+
+        # One vectorised bucket selection for every request that needs it
+        wanted = [i for i, (_, _, stage, _) in enumerate(batch) if stage != 'swl' and results[i]['swl']]
+        buckets = engine.select_optimal_buckets(
+            [batch[i][0] for i in wanted], [batch[i][1] for i in wanted], [results[i]['swl'] for i in wanted])
+        for i, optimal_bucket in zip(wanted, buckets):
+            results[i]['optimal_bucket'] = optimal_bucket
+            if optimal_bucket and batch[i][2] == 'comparison':
+                try:
+                    results[i]['comparison'] = engine.compute_comparison(batch[i][0], optimal_bucket)
+                except ArithmeticError:
+                    results[i]['error'] = 'inputs give a zero payload or swing rate'
+        return results
+
+
+class BucketAPI:
+    def __init__(self):
+        self.catalogues = None
+        self.batcher = None
+        self.request_log = None
+        self.pdf_pool = None
+        self.pdf_jobs = OrderedDict()  # Oldest first
+
+    def startup(self):
+        self.request_log = RequestLog()
+        self.catalogues = CatalogueManager(SWL_CSV, BUCKET_CSV, BHC_BUCKET_CSV, DUMP_TRUCK_CSV,
+                                           prepare=lambda engine: warm_up(engine, self.request_log))
+        self.batcher = MicroBatcher(self.catalogues)
+        self.pdf_pool = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix='pdf')
+
+    def shutdown(self):
+        if self.catalogues is not None:
+            self.catalogues.close()
+        if self.pdf_pool is not None:
+            self.pdf_pool.shutdown(wait=False, cancel_futures=True)
+        if self.request_log is not None:
+            self.request_log.close()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        method, path = scope['method'], scope['path']
+        try:
+            if method == 'GET' and path == '/health':
+                if self.catalogues is None:
+                    status, body = 200, {'status': 'starting'}
+                else:
+                    status, body = 200, {'status': 'ok', 'catalogue_version': self.catalogues.version,
+                                         'catalogue_reloads': self.catalogues.reloads,
+                                         'catalogue_error': self.catalogues.last_error}
+            elif method == 'POST' and path in ('/swl', '/bucket', '/comparison', '/pdf', '/sweep'):
+                request = await self._read_json(receive)
+                if path == '/pdf':
+                    status, body = await self._start_pdf(request)
+                elif path == '/sweep':
+                    status, body = await self._sweep(request)
+                else:
+                    status, body = await self._calculate(request, path[1:])
+            elif method == 'GET' and path.startswith('/pdf/'):
+                await self._pdf_job(path[len('/pdf/'):], send)
+                return
+            else:
+                status, body = 404, {'error': 'not found'}
+        except BadRequest as e:
+            status, body = 400, {'error': str(e)}
+        await self._send_json(send, status, body)
+
+    async def _read_json(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise BadRequest('request body too large')
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        try:
+            return json.loads(b''.join(chunks) or b'null')
+        except ValueError:
+            raise BadRequest('request body is not valid JSON')
+
+    async def _send_json(self, send, status, body):
+        payload = json.dumps(body, default=json_default).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _calculate(self, request, stage):
+        fields = {'swl': SWL_FIELDS, 'bucket': BUCKET_FIELDS, 'comparison': COMPARISON_FIELDS}[stage]
+        user_data = parse_user_data(request, fields)
+        select_bhc = parse_select_bhc(request)
+        result = await self.batcher.submit(user_data, select_bhc, stage)
+        if result['swl'] is None:
+            return 422, {**result, 'error': 'no matching excavator configuration'}
+        if stage != 'swl' and not result.get('optimal_bucket'):
+            return 422, {**result, 'error': 'no bucket within the safe working load'}
+        if 'error' in result:
+            return 422, result
+
+        if stage == 'comparison' and result.get('comparison'):
+            self.request_log.log_calculation(
+                {**user_data, 'truck_brand': request.get('truck_brand'), 'truck_model': request.get('truck_model'),
+                 'select_bhc': select_bhc},
+                {'swl': result['swl'], **result['optimal_bucket'], 'catalogue_version': result['catalogue_version']})
+            if request.get('tables'):
+                tables = build_comparison_data(user_data, result['comparison'],
+                                               request.get('truck_brand', ''), request.get('truck_model', ''))
+                result['tables'] = tables
+        return 200, result
+
+    async def _sweep(self, request):
+        user_data = parse_user_data(request, COMPARISON_FIELDS)
+        grid = parse_grid(request)
+        select_bhc = parse_select_bhc(request)
+        engine = self.catalogues.engine
+        try:
+            engine.excavator_class(user_data['model'])
+        except KeyError:
+            return 422, {'catalogue_version': engine.version, 'error': 'unknown excavator model'}
+        # One batched array pass over the grid; off the event loop since large grids take tens of ms
+        sweep = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: engine.sweep(user_data, select_bhc, **grid))
+        columns = {}
+        for name, values in sweep.items():
+            if values.dtype.kind == 'f':
+                columns[name] = [value if math.isfinite(value) else None for value in values.tolist()]
+            else:
+                columns[name] = [None if pd.isna(value) else value for value in values.tolist()]
+        return 200, {'catalogue_version': engine.version, 'points': len(sweep), 'columns': columns}
+
+    async def _start_pdf(self, request):
+        user_data = parse_user_data(request, COMPARISON_FIELDS)
+        select_bhc = parse_select_bhc(request)
+        result = await self.batcher.submit(user_data, select_bhc, 'comparison')
+        if not result.get('comparison'):
+            return 422, {**result, 'error': result.get('error', 'no matching excavator configuration or bucket')}
+
+        self._expire_pdf_jobs()
+        job_id = secrets.token_urlsafe(12)
+        job = {'status': 'pending', 'created': time.monotonic(), 'pdf': None, 'error': None,
+               'catalogue_version': result['catalogue_version']}
+        self.pdf_jobs[job_id] = job
+        brand, model = request.get('truck_brand', ''), request.get('truck_model', '')
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pdf_pool, render_report, user_data, result, brand, model)
+        future.add_done_callback(lambda f: self._finish_pdf_job(job, f))
+        return 202, {'job_id': job_id, 'catalogue_version': job['catalogue_version'], 'status_url': f'/pdf/{job_id}', 'download_url': f'/pdf/{job_id}.pdf'}
+
+    @staticmethod
+    def _finish_pdf_job(job, future):
+        if future.cancelled():
+            job['status'], job['error'] = 'failed', 'cancelled'
+        elif future.exception() is not None:
+            job['status'], job['error'] = 'failed', str(future.exception())
+        else:
+            job['status'], job['pdf'] = 'done', future.result()
+
+    def _expire_pdf_jobs(self):
+        """Drop jobs older than the TTL, then the oldest beyond PDF_MAX_JOBS (making room for one more)."""
+        cutoff = time.monotonic() - PDF_JOB_TTL
+        while self.pdf_jobs:
+            job_id, job = next(iter(self.pdf_jobs.items()))
+            if job['created'] >= cutoff and len(self.pdf_jobs) < PDF_MAX_JOBS:
+                break
+            del self.pdf_jobs[job_id]
+
+    async def _pdf_job(self, name, send):
+        job_id, download = name, False
+        if name.endswith('.pdf'):
+            job_id, download = name[:-len('.pdf')], True
+        job = self.pdf_jobs.get(job_id)
+        if job is None:
+            await self._send_json(send, 404, {'error': 'unknown or expired job'})
+        elif not download:
+            await self._send_json(send, 200, {'job_id': job_id, 'status': job['status'], 'error': job['error'],
+                                              'catalogue_version': job['catalogue_version']})
+        elif job['status'] != 'done':
+            await self._send_json(send, 409, {'job_id': job_id, 'status': job['status'], 'error': job['error']})
+        else:
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-type', b'application/pdf'),
+                                    (b'content-length', str(len(job['pdf'])).encode())]})
+            await send({'type': 'http.response.body', 'body': job['pdf']})
+
+
+app = BucketAPI()
@@ -0,0 +1,343 @@
+"""Run a file of calculation requests through the engine.
+
+The input is JSONL (one request object per line) or CSV (one request per
+row), with the same fields as the API's /comparison body: make, model,
+cwt, shoe_width, reach, boom_length, arm_length, material_density,
+quick_hitch_weight, current_bucket_size, current_bucket_weight,
+dump_truck_payload, machine_swings_per_minute and optionally
+dump_truck_heaped, select_bhc (true/false), truck_brand, truck_model and an
+``id`` that is copied to the result.
+
+    python batch_calculate.py requests.jsonl results.jsonl
+    python batch_calculate.py requests.csv results.parquet --workers 8 --pdf-dir reports/
+
+The input is read as a stream and cut into chunks of ``--chunk-size``
+requests. Chunks are calculated in a process pool (SWL lookup, one
+vectorised bucket selection per chunk, comparison numbers, optionally the
+PDF report) and written as they complete, so results are not in input
+order; every result carries the input ``line`` it came from. At most two
+chunks per worker are in flight, so memory stays flat however long the
+input is.
+
+Output is JSONL (one result per line, shaped like the API's responses) or,
+for a ``.parquet`` path, a directory of Parquet files, one per chunk (needs
+pyarrow). A ``<output>.progress`` file records every finished chunk; run
+the same command again after an interruption and it carries on from
+there. ``--restart`` starts over.
+"""
+
+import argparse
+import csv
+import importlib.util
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from pdf_report import render_report
+from request_log import json_default
+from shared_catalogue import engine_from_env
+from user_input import COMPARISON_FIELDS, BadRequest, clean_value, parse_select_bhc, parse_user_data
+
+SWL_CSV = os.environ.get('BUCKET_SWL_CSV', 'excavator_swl.csv')
+BUCKET_CSV = os.environ.get('BUCKET_BUCKET_CSV', 'bucket_data.csv')
+BHC_BUCKET_CSV = os.environ.get('BUCKET_BHC_BUCKET_CSV', 'bhc_bucket_data.csv')
+DUMP_TRUCK_CSV = os.environ.get('BUCKET_DUMP_TRUCK_CSV', 'dump_trucks.csv')
+
+DEFAULT_CHUNK_SIZE = 2000
+IN_FLIGHT_PER_WORKER = 2
+BUCKET_COLUMNS = ['bucket_name', 'bucket_size', 'bucket_weight', 'total_bucket_weight']
+COMPARISON_COLUMNS = [
+    'old_capacity', 'new_capacity', 'old_payload', 'new_payload', 'dump_truck_payload',
+    'old_total_load', 'new_total_load', 'dump_truck_payload_old', 'dump_truck_payload_new',
+    'swings_to_fill_truck_old', 'swings_to_fill_truck_new', 'time_to_fill_truck_old', 'time_to_fill_truck_new',
+    'avg_trucks_per_hour_old', 'avg_trucks_per_hour_new', 'swings_per_hour_old', 'swings_per_hour_new',
+    'total_swings_per_hour', 'truck_tonnage_per_hour_old', 'truck_tonnage_per_hour_new',
+    'total_tonnage_per_hour_old', 'total_tonnage_per_hour_new', 'tonnage_per_hour_old', 'tonnage_per_hour_new',
+    'total_m3_per_day_old', 'total_m3_per_day_new', 'total_tonnage_per_day_old', 'total_tonnage_per_day_new',
+    'total_trucks_per_day_old', 'total_trucks_per_day_new', 'productivity',
+]
+
+# Per-process state, set up once by _init_worker
+_engine = None
+_pdf_dir = None
+
+
+# Reading
+def read_requests(path):
+    """Yield (line number, raw request) from a JSONL or CSV file without reading it all in.
+
+    JSONL requests are yielded as the unparsed line (workers parse them);
+    CSV rows as dicts, with empty cells left out.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, {key: value for key, value in row.items() if value not in ('', None)}
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, line
+
+
+def chunked(requests, chunk_size):
+    """Number and group the requests: (chunk number, [(line, raw), ...])."""
+    requests = iter(requests)
+    for chunk_number in itertools.count():
+        chunk = list(itertools.islice(requests, chunk_size))
+        if not chunk:
+            return
+        yield chunk_number, chunk
+
+
+# Calculating (in the worker processes)
+def _init_worker(csvs, pdf_dir):
+    global _engine, _pdf_dir
+    _engine = engine_from_env(*csvs)
+    _pdf_dir = pdf_dir
+
+
+def _parse(request):
+    return parse_user_data(request, COMPARISON_FIELDS), parse_select_bhc(request)
+
+
+def _write_pdf(line, user_data, result, request):
+    path = os.path.join(_pdf_dir, f'{line}.pdf')
+    pdf = render_report(user_data, result, request.get('truck_brand', ''), request.get('truck_model', ''))
+    with open(path + '.tmp', 'wb') as f:
+        f.write(pdf)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def process_chunk(chunk_number, chunk):
+    """Calculate one chunk; returns (chunk number, results in input order)."""
+    engine = _engine
+    results, parsed = [], []
+    for line, raw in chunk:
+        result = {'line': line, 'status': 'ok', 'catalogue_version': engine.version}
+        try:
+            request = json.loads(raw) if isinstance(raw, str) else raw
+            if isinstance(request, dict) and 'id' in request:
+                result['id'] = request['id']
+            user_data, select_bhc = _parse(request)
+        except (ValueError, BadRequest) as e:
+            result.update(status='invalid', error=str(e))
+            results.append(result)
+            continue
+        result['swl'] = clean_value(engine.find_matching_swl(user_data))
+        if not result['swl']:
+            result.update(status='no_match', error='no matching excavator configuration')
+        results.append(result)
+        parsed.append((result, request, user_data, select_bhc))
+
+    # One vectorised bucket selection for the whole chunk, as the API does per batch
+    wanted = [item for item in parsed if item[0]['status'] == 'ok']
+    buckets = engine.select_optimal_buckets([item[2] for item in wanted], [item[3] for item in wanted],
+                                            [item[0]['swl'] for item in wanted])
+    for (result, request, user_data, _), optimal_bucket in zip(wanted, buckets):
+        if not optimal_bucket:
+            result.update(status='no_match', error='no bucket within the safe working load')
+            continue
+        result['optimal_bucket'] = optimal_bucket
+        try:
+            result['comparison'] = engine.compute_comparison(user_data, optimal_bucket)
+        except ArithmeticError:
+            result.update(status='error', error='inputs give a zero payload or swing rate')
+            continue
+        if _pdf_dir:
+            try:
+                result['pdf'] = _write_pdf(result['line'], user_data, result, request)
+            except Exception as e:  # One bad report mustn't take the chunk (and the run) down with it
+                result.update(status='error', error=f'PDF rendering failed: {e}')
+    return chunk_number, results
+
+
+# Writing
+class JsonlOutput:
+    """Appends results to one JSONL file; checkpoints are byte offsets."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def open(self, checkpoint):
+        mode = 'r+b' if checkpoint and os.path.exists(self.path) else 'wb'
+        self._file = open(self.path, mode)
+        # Drop anything written after the last finished chunk (e.g. a crash mid-write)
+        self._file.truncate(checkpoint or 0)
+        self._file.seek(0, os.SEEK_END)
+
+    def write(self, chunk_number, results):
+        self._file.write(''.join(json.dumps(result, default=json_default) + '\n' for result in results).encode('utf-8'))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ParquetOutput:
+    """Writes each chunk as its own Parquet file (part-<chunk>.parquet) in a directory."""
+
+    def __init__(self, path):
+        if importlib.util.find_spec('pyarrow') is None:
+            sys.exit("Parquet output needs pyarrow (pip install pyarrow); use a .jsonl output instead")
+        self.path = path
+
+    def open(self, checkpoint):
+        os.makedirs(self.path, exist_ok=True)
+        if checkpoint is None:
+            for name in os.listdir(self.path):
+                if name.startswith('part-'):
+                    os.remove(os.path.join(self.path, name))
+
+    def write(self, chunk_number, results):
+        rows = []
+        for result in results:
+            row = {'line': result['line'], 'id': None if result.get('id') is None else str(result['id']),
+                   'status': result['status'], 'error': result.get('error'),
+                   'catalogue_version': result['catalogue_version'], 'swl': result.get('swl'),
+                   'pdf': result.get('pdf')}
+            optimal_bucket = result.get('optimal_bucket') or {}
+            comparison = result.get('comparison') or {}
+            row.update({column: optimal_bucket.get(column) for column in BUCKET_COLUMNS})
+            row.update({column: comparison.get(column) for column in COMPARISON_COLUMNS})
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        for column in ['swl'] + BUCKET_COLUMNS[1:] + COMPARISON_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+        for column in ['id', 'status', 'error', 'catalogue_version', 'pdf', 'bucket_name']:
+            df[column] = df[column].astype('string')  # Same schema in every part, even all-null columns
+        path = os.path.join(self.path, f'part-{chunk_number:06d}.parquet')
+        df.to_parquet(path + '.tmp', index=False, engine='pyarrow')
+        os.replace(path + '.tmp', path)
+        return 0
+
+    def close(self):
+        pass
+
+
+# Progress
+def progress_path(output):
+    return output.rstrip('/\\') + '.progress'
+
+
+def load_progress(path, settings):
+    """Finished chunk numbers and the output checkpoint from an earlier run with the same settings."""
+    done, checkpoint = set(), 0
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return done, checkpoint
+    if not lines or json.loads(lines[0]) != settings:
+        sys.exit(f"{path} is from a run with a different input, chunk size or output; "
+                 f"use --restart to start over")
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            break  # Torn last line
+        done.add(entry['chunk'])
+        checkpoint = entry['offset']
+    return done, checkpoint
+
+
+def run(input_path, output_path, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, pdf_dir=None, restart=False,
+        csvs=(SWL_CSV, BUCKET_CSV, BHC_BUCKET_CSV, DUMP_TRUCK_CSV)):
+    """Process ``input_path`` into ``output_path``; returns counts by status."""
+    output = ParquetOutput(output_path) if output_path.lower().endswith('.parquet') else JsonlOutput(output_path)
+    settings = {'input': os.path.abspath(input_path), 'output': os.path.abspath(output_path),
+                'chunk_size': chunk_size}
+    progress_file = progress_path(output_path)
+    if restart and os.path.exists(progress_file):
+        os.remove(progress_file)
+    done, checkpoint = load_progress(progress_file, settings)
+    if done:
+        print(f"Resuming: {len(done)} chunks already done")
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
+
+    output.open(checkpoint if done else None)
+    progress = open(progress_file, 'a', encoding='utf-8')
+    if not done:
+        progress.truncate(0)
+        progress.write(json.dumps(settings) + '\n')
+        progress.flush()
+
+    counts = {'ok': 0, 'no_match': 0, 'invalid': 0, 'error': 0}
+    start = last_report = time.monotonic()
+    versions = set()
+
+    def finish(chunk_number, results):
+        nonlocal last_report
+        offset = output.write(chunk_number, results)
+        progress.write(json.dumps({'chunk': chunk_number, 'offset': offset, 'records': len(results)}) + '\n')
+        progress.flush()
+        os.fsync(progress.fileno())
+        for result in results:
+            counts[result['status']] += 1
+            versions.add(result['catalogue_version'])
+        if time.monotonic() - last_report > 10:
+            last_report = time.monotonic()
+            total = sum(counts.values())
+            print(f"{total} requests, {total / (last_report - start):.0f}/s")
+
+    chunks = ((number, chunk) for number, chunk in chunked(read_requests(input_path), chunk_size)
+              if number not in done)
+    try:
+        if workers == 0:
+            _init_worker(csvs, pdf_dir)
+            for number, chunk in chunks:
+                finish(*process_chunk(number, chunk))
+        else:
+            workers = workers or os.cpu_count()
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(csvs, pdf_dir)) as pool:
+                pending = set()
+                for number, chunk in chunks:
+                    pending.add(pool.submit(process_chunk, number, chunk))
+                    if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            finish(*future.result())
+                for future in wait(pending).done:
+                    finish(*future.result())
+    finally:
+        output.close()
+        progress.close()
+
+    seconds = time.monotonic() - start
+    total = sum(counts.values())
+    print(f"Done: {total} requests in {seconds:.1f}s ({total / seconds if seconds else 0:.0f}/s): "
+          + ', '.join(f'{count} {status}' for status, count in counts.items()))
+    if len(versions) > 1:
+        print(f"Warning: the catalogue changed during the run; results span versions {', '.join(sorted(versions))}")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('input', help='JSONL or CSV file of calculation requests')
+    parser.add_argument('output', help='results file (.jsonl, or .parquet for a Parquet directory)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU; 0 runs in this process)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='requests per chunk')
+    parser.add_argument('--pdf-dir', help='also render each report to <pdf-dir>/<line>.pdf')
+    parser.add_argument('--restart', action='store_true', help='ignore earlier progress and start over')
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be at least 1')
+    run(args.input, args.output, args.workers, args.chunk_size, args.pdf_dir, args.restart)
+
+
+if __name__ == '__main__':
+    main()
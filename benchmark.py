@@ -0,0 +1,397 @@
+"""Benchmarks for the calculation, rendering and delivery hot paths.
+
+Each case is timed asv-style: the call count is calibrated so one repeat
+takes at least ``--min-time`` seconds, the repeat is run several times and
+the min and median time per call are kept. Calculation cases run against
+synthetic catalogues scaled from the shipped CSVs (1x, 10x and 100x by
+default); rendering and delivery cases don't depend on catalogue size and
+run once.
+
+Results are written to benchmark_results/<timestamp>.json. Compare a run
+with an earlier one with ``--compare``:
+
+    python benchmark.py
+    python benchmark.py --scales 1 10 --compare benchmark_results/20241019-101500.json
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from reportlab.platypus import Paragraph
+
+import bucket_engine
+from bucket_engine import TRUCK_HEAPED_COLUMN, BucketEngine
+from delivery import build_pdf_email
+from pdf_report import generate_pdf, get_pdf_styles, render_pdf
+from report_tables import build_comparison_data, generate_html_table, notes_text
+
+SWL_CSV = 'excavator_swl.csv'
+BUCKET_CSV = 'bucket_data.csv'
+BHC_BUCKET_CSV = 'bhc_bucket_data.csv'
+DUMP_TRUCK_CSV = 'dump_trucks.csv'
+
+DEFAULT_SCALES = [1, 10, 100]
+DEFAULT_RESULTS_DIR = 'benchmark_results'
+REGRESSION_THRESHOLD = 1.2
+SECTION_TITLES = [
+    "Side-by-Side Bucket Comparison", "Loadout Productivity & Truck Pass Simulation",
+    "1000 Swings Side-by-Side Simulation", "10% Improved Cycle Time Simulation"
+]
+
+
+def _scale_frame(df, factor, rng, rename_column, jitter_columns):
+    """Repeat ``df`` ``factor`` times; copies get a suffixed name and jittered numbers."""
+    copies = [df]
+    for k in range(1, factor):
+        copy = df.copy()
+        copy[rename_column] = copy[rename_column].astype(str) + f'-S{k}'
+        for column in jitter_columns:
+            noise = rng.uniform(0.95, 1.05, len(copy))
+            copy[column] = (copy[column] * noise).round(2)
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def synthetic_catalogues(factor, seed=0, swl_csv=SWL_CSV, bucket_csv=BUCKET_CSV,
+                         bhc_bucket_csv=BHC_BUCKET_CSV, dump_truck_csv=DUMP_TRUCK_CSV):
+    """Shipped catalogues scaled ``factor`` times, reproducible for a given seed.
+
+    Returns (swl_data, bucket_data, bhc_bucket_data, dump_truck_data).
+    """
+    rng = np.random.default_rng(seed)
+    swl_data = bucket_engine.load_excavator_swl_data(swl_csv)
+    bucket_data = bucket_engine.load_bucket_data(bucket_csv)
+    bhc_bucket_data = bucket_engine.load_bhc_bucket_data(bhc_bucket_csv)
+    dump_truck_data = bucket_engine.load_dump_truck_data(dump_truck_csv)
+    if factor == 1:
+        return swl_data, bucket_data, bhc_bucket_data, dump_truck_data
+    return (
+        _scale_frame(swl_data, factor, rng, 'model', ['swl']),
+        _scale_frame(bucket_data, factor, rng, 'bucket_name', ['bucket_size', 'bucket_weight']),
+        _scale_frame(bhc_bucket_data, factor, rng, 'bucket_name', ['bucket_size', 'bucket_weight']),
+        _scale_frame(dump_truck_data, factor, rng, 'model', ['payload']),
+    )
+
+
+def sample_user_data(swl_data, dump_truck_data, count=50, seed=0):
+    """Deterministic set of realistic calculation inputs drawn from the catalogues."""
+    rng = np.random.default_rng(seed)
+    rows = swl_data.dropna(subset=['swl']).sample(n=min(count, len(swl_data)), random_state=seed)
+    trucks = dump_truck_data.sample(n=len(rows), replace=True, random_state=seed)
+    samples = []
+    for row, truck in zip(rows.to_dict('records'), trucks.to_dict('records')):
+        samples.append({
+            'make': row['make'],
+            'model': row['model'],
+            'boom_length': row['boom_length'],
+            'arm_length': row['arm_length'],
+            'cwt': row['CWT'],
+            'shoe_width': row['shoe_width'],
+            'reach': row['reach'],
+            'material_density': float(rng.choice([1400, 1600, 1800, 2000])),
+            'quick_hitch_weight': float(rng.choice([0, 500, 1000])),
+            'current_bucket_size': float(rng.choice([1.5, 2.0, 2.5, 3.0])),
+            'current_bucket_weight': float(rng.choice([1200, 1500, 1800])),
+            'dump_truck_payload': truck['payload'],
+            'dump_truck_heaped': None if pd.isna(truck[TRUCK_HEAPED_COLUMN]) else float(truck[TRUCK_HEAPED_COLUMN]),
+            'machine_swings_per_minute': float(rng.choice([2.5, 3.0, 3.5])),
+            'truck_brand': truck['brand'],
+            'truck_model': truck['model'],
+        })
+    return samples
+
+
+class _Cycle:
+    """Hand out the samples round-robin so every call sees a different input."""
+
+    def __init__(self, items):
+        self.items = items
+        self.i = 0
+
+    def next(self):
+        item = self.items[self.i % len(self.items)]
+        self.i += 1
+        return item
+
+
+def calculation_cases(factor):
+    """Benchmarks whose cost depends on catalogue size."""
+    swl_data, bucket_data, bhc_bucket_data, dump_truck_data = synthetic_catalogues(factor)
+    samples = sample_user_data(swl_data, dump_truck_data)
+    swls = [bucket_engine.find_matching_swl(user_data, swl_data) for user_data in samples]
+    inputs = _Cycle([(user_data, swl) for user_data, swl in zip(samples, swls) if swl])
+    buckets = [bucket_engine.select_optimal_bucket(user_data, bucket_data, swl, swl_data)
+               for user_data, swl in inputs.items]
+    with_bucket = _Cycle([(user_data, swl, b) for (user_data, swl), b in zip(inputs.items, buckets) if b])
+    users = _Cycle(samples)
+
+    def fresh_engine():
+        return BucketEngine(swl_data, bucket_data, bhc_bucket_data, dump_truck_data)
+
+    # The cached/warm cases measure memo hits, so prime them with every sample first
+    engine = fresh_engine()
+    for user_data in samples:
+        engine.calculate(user_data)
+
+    def swl_lookup_reference():
+        bucket_engine.find_matching_swl(users.next(), swl_data)
+
+    def swl_lookup_indexed():
+        engine.find_matching_swl(users.next())
+
+    def bucket_selection_reference():
+        user_data, swl = inputs.next()
+        bucket_engine.select_optimal_bucket(user_data, bucket_data, swl, swl_data)
+
+    def bucket_selection_cached():
+        user_data, swl = inputs.next()
+        engine.select_optimal_bucket(user_data, False, swl)
+
+    def pass_matching():
+        user_data, swl, optimal_bucket = with_bucket.next()
+        dump_truck_payload = bucket_engine.truck_capacity(user_data)
+        bucket_engine.adjust_payload_for_new_bucket(
+            dump_truck_payload, optimal_bucket['bucket_size'] * user_data['material_density'])
+        bucket_engine.adjust_payload_for_old_bucket(
+            dump_truck_payload, user_data['current_bucket_size'] * user_data['material_density'])
+
+    def full_comparison_reference():
+        user_data = users.next()
+        swl = bucket_engine.find_matching_swl(user_data, swl_data)
+        if not swl:
+            return
+        optimal_bucket = bucket_engine.select_optimal_bucket(user_data, bucket_data, swl, swl_data)
+        if not optimal_bucket:
+            return
+        comparison = bucket_engine.compute_comparison(user_data, optimal_bucket)
+        build_comparison_data(user_data, comparison, user_data['truck_brand'], user_data['truck_model'])
+
+    def full_comparison_engine_cold():
+        # A new engine per call: indexes are built but nothing is memoised yet
+        result = fresh_engine().calculate(users.next())
+        if result:
+            user_data = users.items[(users.i - 1) % len(users.items)]
+            build_comparison_data(user_data, result['comparison'], user_data['truck_brand'], user_data['truck_model'])
+
+    def full_comparison_engine_warm():
+        user_data = users.next()
+        result = engine.calculate(user_data)
+        if result:
+            build_comparison_data(user_data, result['comparison'], user_data['truck_brand'], user_data['truck_model'])
+
+    sweep_densities = np.linspace(1200, 2400, 25)
+
+    def density_sweep_loop():
+        # What a user retyping 25 densities costs: one reference calculation each
+        user_data, swl = inputs.next()
+        for density in sweep_densities:
+            point = dict(user_data, material_density=density)
+            optimal_bucket = bucket_engine.select_optimal_bucket(point, bucket_data, swl, swl_data)
+            if optimal_bucket:
+                bucket_engine.compute_comparison(point, optimal_bucket)
+
+    def density_sweep_vectorised():
+        engine.sweep(inputs.next()[0], material_density=sweep_densities)
+
+    return [
+        ('swl_lookup_reference', swl_lookup_reference),
+        ('swl_lookup_indexed', swl_lookup_indexed),
+        ('bucket_selection_reference', bucket_selection_reference),
+        ('bucket_selection_cached', bucket_selection_cached),
+        ('pass_matching', pass_matching),
+        ('full_comparison_reference', full_comparison_reference),
+        ('full_comparison_engine_cold', full_comparison_engine_cold),
+        ('full_comparison_engine_warm', full_comparison_engine_warm),
+        ('density_sweep_loop', density_sweep_loop),
+        ('density_sweep_vectorised', density_sweep_vectorised),
+    ]
+
+
+def sample_report():
+    """user_data, SWL, tables, table frames and notes paragraph of the first calculable sample."""
+    engine = BucketEngine.from_csv(SWL_CSV, BUCKET_CSV, BHC_BUCKET_CSV, DUMP_TRUCK_CSV)
+    samples = sample_user_data(engine.swl_data, engine.dump_truck_data)
+    for user_data in samples:
+        result = engine.calculate(user_data)
+        if result:
+            break
+    swl, optimal_bucket, comparison = result['swl'], result['optimal_bucket'], result['comparison']
+    brand, model = user_data['truck_brand'], user_data['truck_model']
+    tables = build_comparison_data(user_data, comparison, brand, model)
+    frames = [pd.DataFrame(data) for data in tables]
+    paragraph = Paragraph(notes_text(user_data, optimal_bucket, swl, comparison, brand, model), get_pdf_styles()['Normal'])
+    return user_data, swl, tables, frames, paragraph
+
+
+def pdf_sizes():
+    """Bytes of the legacy and compact report, as a file and as the SendGrid request body."""
+    _, _, _, frames, paragraph = sample_report()
+    sizes = {}
+    renders = [('legacy', render_pdf(paragraph, frames, compact=False)), ('compact', render_pdf(paragraph, frames))]
+    for name, pdf_content in renders:
+        payload = build_pdf_email('from@example.com', 'someone@example.com', pdf_content).get()
+        sizes[name] = {'pdf_bytes': len(pdf_content), 'email_payload_bytes': len(json.dumps(payload))}
+    return sizes
+
+
+def rendering_cases():
+    """Benchmarks that only depend on a single comparison result."""
+    user_data, swl, tables, frames, paragraph = sample_report()
+    pdf_content = render_pdf(paragraph, frames)
+    legacy_pdf_content = render_pdf(paragraph, frames, compact=False)
+
+    def html_rendering():
+        for data, title in zip(tables, SECTION_TITLES):
+            generate_html_table(data, title)
+
+    def pdf_rendering():
+        render_pdf(paragraph, frames)
+
+    def pdf_rendering_legacy():
+        render_pdf(paragraph, frames, compact=False)
+
+    def pdf_rendering_cached():
+        generate_pdf(paragraph, *frames, user_data, swl, compact=True)
+
+    def email_payload():
+        build_pdf_email('from@example.com', 'someone@example.com', pdf_content).get()
+
+    def email_payload_legacy():
+        build_pdf_email('from@example.com', 'someone@example.com', legacy_pdf_content).get()
+
+    return [
+        ('html_rendering', html_rendering),
+        ('pdf_rendering', pdf_rendering),
+        ('pdf_rendering_legacy', pdf_rendering_legacy),
+        ('pdf_rendering_cached', pdf_rendering_cached),
+        ('email_payload', email_payload),
+        ('email_payload_legacy', email_payload_legacy),
+    ]
+
+
+def time_case(func, min_time=0.05, repeat=5):
+    """Return (min, median) seconds per call, asv style."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return min(samples), statistics.median(samples), number
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scales, only=None, min_time=0.05, repeat=5):
+    results = {}
+
+    def record(name, func):
+        if only and not any(fnmatch.fnmatch(name, pattern) for pattern in only):
+            return
+        best, median, number = time_case(func, min_time, repeat)
+        results[name] = {'min_s': best, 'median_s': median, 'number': number, 'repeat': repeat}
+        print(f"{name:<48}{best * 1e6:>14.1f} us{median * 1e6:>14.1f} us")
+
+    print(f"{'benchmark':<48}{'min':>17}{'median':>17}")
+    for factor in scales:
+        for name, func in calculation_cases(factor):
+            record(f'{name}[{factor}x]', func)
+    for name, func in rendering_cases():
+        record(name, func)
+
+    sizes = pdf_sizes()
+    print(f"\n{'report size':<48}{'pdf':>17}{'email payload':>17}")
+    for name, size in sizes.items():
+        print(f"{name:<48}{size['pdf_bytes']:>15} B{size['email_payload_bytes']:>15} B")
+    saved = 1 - sizes['compact']['pdf_bytes'] / sizes['legacy']['pdf_bytes']
+    print(f"{'compact saves':<48}{saved:>16.0%}{1 - sizes['compact']['email_payload_bytes'] / sizes['legacy']['email_payload_bytes']:>17.0%}")
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'scales': scales,
+        },
+        'results': results,
+        'pdf_sizes': sizes,
+    }
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print current/baseline ratios of the min times; return the regressed benchmark names."""
+    regressions = []
+    print(f"\n{'benchmark':<48}{'baseline':>14}{'current':>14}{'ratio':>9}")
+    for name, stats in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        ratio = stats['min_s'] / before['min_s'] if before['min_s'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / threshold:
+            flag = '  faster'
+        print(f"{name:<48}{before['min_s'] * 1e6:>11.1f} us{stats['min_s'] * 1e6:>11.1f} us{ratio:>8.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='catalogue scale factors (default: 1 10 100)')
+    parser.add_argument('--only', nargs='+', help='glob patterns of benchmarks to run, e.g. "pdf_*"')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per repeat')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output-dir', default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='slowdown ratio reported as a regression (default: 1.2)')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 on regressions')
+    args = parser.parse_args(argv)
+
+    current = run(args.scales, args.only, args.min_time, args.repeat)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults written to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
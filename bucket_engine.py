@@ -0,0 +1,725 @@
+"""Bucket calculation engine shared by the Streamlit app and offline tooling.
+
+The module level functions are the reference calculations (SWL lookup,
+bucket selection, truck pass matching and the comparison numbers).
+``BucketEngine`` holds one loaded set of catalogues together with lookup
+indexes and memoised results so repeated calculations are cheap.
+"""
+
+import hashlib
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+SWL_KEY_COLUMNS = ['make', 'model', 'CWT', 'shoe_width', 'reach', 'boom_length', 'arm_length']
+SWL_KEY_FIELDS = ['make', 'model', 'cwt', 'shoe_width', 'reach', 'boom_length', 'arm_length']
+SWEEP_PARAMETERS = ['material_density', 'machine_swings_per_minute', 'quick_hitch_weight', 'reach']
+TRUCK_HEAPED_COLUMN = 'heaped 2:1'
+REQUIRED_COLUMNS = {
+    'swl_data': SWL_KEY_COLUMNS + ['swl', 'class'],
+    'bucket_data': ['bucket_name', 'bucket_size', 'bucket_weight', 'class'],
+    'bhc_bucket_data': ['bucket_name', 'bucket_size', 'bucket_weight', 'class'],
+    'dump_truck_data': ['brand', 'type', 'model', 'payload'],
+}
+
+# Load datasets
+def load_bucket_data(bucket_csv):
+    return pd.read_csv(bucket_csv)
+
+def load_bhc_bucket_data(bhc_bucket_csv):
+    return pd.read_csv(bhc_bucket_csv)
+
+def load_dump_truck_data(dump_truck_csv):
+    dump_truck_data = pd.read_csv(dump_truck_csv)
+    # Body volumes in m³; 'Custom' bodies have none
+    dump_truck_data['struck'] = pd.to_numeric(dump_truck_data['struck'], errors='coerce')
+    dump_truck_data[TRUCK_HEAPED_COLUMN] = pd.to_numeric(dump_truck_data[TRUCK_HEAPED_COLUMN], errors='coerce')
+    return dump_truck_data
+
+def load_excavator_swl_data(swl_csv):
+    swl_data = pd.read_csv(swl_csv)
+    swl_data['boom_length'] = pd.to_numeric(swl_data['boom_length'], errors='coerce')
+    swl_data['arm_length'] = pd.to_numeric(swl_data['arm_length'], errors='coerce')
+    swl_data['CWT'] = pd.to_numeric(swl_data['CWT'], errors='coerce')
+    swl_data['shoe_width'] = pd.to_numeric(swl_data['shoe_width'], errors='coerce')
+    swl_data['reach'] = pd.to_numeric(swl_data['reach'], errors='coerce')
+    swl_data['class'] = pd.to_numeric(swl_data['class'], errors='coerce')
+    return swl_data
+
+def file_signature(paths):
+    """(mtime, size) of every file, None for missing ones; changes whenever a file is rewritten."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def read_sources(paths, attempts=5):
+    """Read the catalogue files as one consistent snapshot.
+
+    The files are read again if any of them changed while they were being
+    read. Returns (sha256 hex digest over all files, list of file contents).
+    """
+    for _ in range(attempts):
+        before = file_signature(paths)
+        contents = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                contents.append(f.read())
+        if file_signature(paths) == before:
+            digest = hashlib.sha256()
+            for content in contents:
+                digest.update(hashlib.sha256(content).digest())
+            return digest.hexdigest(), contents
+    raise RuntimeError(f"catalogue files kept changing while being read: {', '.join(paths)}")
+
+def load_catalogues(contents):
+    """Parse (swl, bucket, bhc_bucket, dump_truck) CSV contents into DataFrames."""
+    swl, bucket, bhc_bucket, dump_truck = [io.BytesIO(content) for content in contents]
+    return (load_excavator_swl_data(swl), load_bucket_data(bucket),
+            load_bhc_bucket_data(bhc_bucket), load_dump_truck_data(dump_truck))
+
+def validate_catalogues(swl_data, bucket_data, bhc_bucket_data, dump_truck_data):
+    """Raise ValueError unless every catalogue has rows and the columns the calculation uses."""
+    frames = dict(zip(REQUIRED_COLUMNS, [swl_data, bucket_data, bhc_bucket_data, dump_truck_data]))
+    for name, columns in REQUIRED_COLUMNS.items():
+        missing = [column for column in columns if column not in frames[name].columns]
+        if missing:
+            raise ValueError(f"{name} is missing columns: {', '.join(missing)}")
+        if frames[name].empty:
+            raise ValueError(f"{name} has no rows")
+
+# Find matching SWL
+def find_matching_swl(user_data, swl_data):
+    matching_excavator = swl_data[
+        (swl_data['make'] == user_data['make']) &
+        (swl_data['model'] == user_data['model']) &
+        (swl_data['CWT'] == user_data['cwt']) &
+        (swl_data['shoe_width'] == user_data['shoe_width']) &
+        (swl_data['reach'] == user_data['reach']) &
+        (swl_data['boom_length'] == user_data['boom_length']) &
+        (swl_data['arm_length'] == user_data['arm_length'])
+    ]
+    if matching_excavator.empty:
+        return None
+    swl = matching_excavator.iloc[0]['swl']
+    return swl
+
+# Function to calculate bucket load
+def calculate_bucket_load(bucket_size, material_density):
+    return bucket_size * material_density
+
+def truck_capacity(user_data):
+    """Load (kg) the selected truck carries: its rated payload, or less if the
+    heaped body volume (``dump_truck_heaped``, m³) fills first with light material."""
+    capacity = user_data['dump_truck_payload'] * 1000
+    heaped = user_data.get('dump_truck_heaped')
+    if heaped is not None and heaped == heaped:
+        capacity = min(capacity, heaped * user_data['material_density'])
+    return capacity
+
+def truck_capacities(dump_truck_payloads, dump_truck_heaped, material_densities):
+    """Vectorised truck_capacity; returns (capacities in kg, volume-limited mask). NaN heaped means no volume limit."""
+    masses = np.asarray(dump_truck_payloads, dtype=float) * 1000
+    volumes = np.asarray(dump_truck_heaped, dtype=float) * material_densities
+    volume_limited = volumes < masses
+    return np.where(volume_limited, volumes, masses), volume_limited
+
+def select_optimal_bucket(user_data, bucket_data, swl, swl_data):
+    optimal_bucket = None
+    highest_bucket_size = 0
+
+    selected_model = user_data['model']
+    excavator_class = swl_data[swl_data['model'] == selected_model]['class'].iloc[0]
+
+    for index, bucket in bucket_data.iterrows():
+        if bucket['class'] > excavator_class + 10:
+            continue
+
+        bucket_load = calculate_bucket_load(bucket['bucket_size'], user_data['material_density'])
+        total_bucket_weight = user_data['quick_hitch_weight'] + bucket_load + bucket['bucket_weight']
+
+        if total_bucket_weight <= swl and bucket['bucket_size'] > highest_bucket_size:
+            highest_bucket_size = bucket['bucket_size']
+            optimal_bucket = {
+                'bucket_name': bucket['bucket_name'],
+                'bucket_size': highest_bucket_size,
+                'bucket_weight': bucket['bucket_weight'],
+                'total_bucket_weight': total_bucket_weight
+            }
+
+    return optimal_bucket
+
+def select_optimal_bucket_indices(bucket_sizes, bucket_weights, bucket_classes,
+                                  excavator_classes, material_densities, quick_hitch_weights, swls):
+    """Vectorised select_optimal_bucket over a batch of requests.
+
+    Bucket arguments are 1-D arrays over the catalogue, the rest are 1-D
+    arrays over the requests. Returns (indices, total_bucket_weights) where
+    index -1 means no bucket fits. Ties go to the first bucket in catalogue
+    order, as in the loop.
+    """
+    bucket_loads = bucket_sizes[None, :] * material_densities[:, None]
+    totals = quick_hitch_weights[:, None] + bucket_loads + bucket_weights[None, :]
+    feasible = (
+        ~(bucket_classes[None, :] > excavator_classes[:, None] + 10) &
+        (totals <= swls[:, None]) &
+        (bucket_sizes[None, :] > 0)
+    )
+    sizes = np.where(feasible, bucket_sizes[None, :], -np.inf)
+    indices = sizes.argmax(axis=1)
+    found = feasible[np.arange(len(indices)), indices]
+    indices = np.where(found, indices, -1)
+    chosen_totals = totals[np.arange(len(indices)), np.maximum(indices, 0)]
+    return indices, chosen_totals
+
+def adjust_payload_for_new_bucket(dump_truck_payload, new_payload):
+    max_payload = dump_truck_payload * 1.10  # Allow up to 10% adjustment
+    increment = dump_truck_payload * 0.001   # Fine adjustment increments
+
+    # Try to achieve swing values within ±0.14 tolerance
+    current_payload = dump_truck_payload
+    while current_payload <= max_payload:
+        swings_to_fill_truck_new = current_payload / new_payload
+        if abs(swings_to_fill_truck_new - math.ceil(swings_to_fill_truck_new)) <= 0.05:
+            return current_payload, swings_to_fill_truck_new
+        current_payload += increment
+
+    # If no suitable payload is found, return the original payload with calculated swings
+    swings_to_fill_truck_new = dump_truck_payload / new_payload
+    return dump_truck_payload, swings_to_fill_truck_new
+
+def adjust_payload_for_old_bucket(dump_truck_payload, old_payload):
+    max_payload = dump_truck_payload * 1.10  # Allow up to 10% adjustment
+    increment = dump_truck_payload * 0.001   # Fine adjustment increments
+
+    # Try to achieve swing values within ±0.14 tolerance
+    current_payload = dump_truck_payload
+    while current_payload <= max_payload:
+        swings_to_fill_truck_old = current_payload / old_payload
+        if abs(swings_to_fill_truck_old - math.ceil(swings_to_fill_truck_old)) <= 0.05:
+            return current_payload, swings_to_fill_truck_old
+        current_payload += increment
+
+    # If no suitable payload is found, return the original payload with calculated swings
+    swings_to_fill_truck_old = dump_truck_payload / old_payload
+    return dump_truck_payload, swings_to_fill_truck_old
+
+def compute_comparison(user_data, optimal_bucket):
+    """Calculate the old vs XMOR® bucket numbers shown in the comparison tables."""
+    old_payload = calculate_bucket_load(user_data['current_bucket_size'], user_data['material_density'])
+    new_payload = calculate_bucket_load(optimal_bucket['bucket_size'], user_data['material_density'])
+    dump_truck_payload = truck_capacity(user_data)
+
+    # Adjust payload for each bucket so the truck fills in a whole number of passes
+    old_passes = adjust_payload_for_old_bucket(dump_truck_payload, old_payload)
+    new_passes = adjust_payload_for_new_bucket(dump_truck_payload, new_payload)
+    return comparison_numbers(user_data, optimal_bucket, old_passes, new_passes)
+
+def comparison_numbers(user_data, optimal_bucket, old_passes, new_passes):
+    """compute_comparison once the truck pass matching is done.
+
+    ``old_passes``/``new_passes`` are the (adjusted truck payload, swings to
+    fill the truck) results of adjust_payload_for_old_bucket/_new_bucket.
+    """
+    old_capacity = user_data['current_bucket_size']
+    new_capacity = optimal_bucket['bucket_size']
+    old_payload = calculate_bucket_load(old_capacity, user_data['material_density'])
+    new_payload = calculate_bucket_load(new_capacity, user_data['material_density'])
+
+    dump_truck_payload = truck_capacity(user_data)
+    machine_swings_per_minute = user_data['machine_swings_per_minute']
+
+    # Total suspended load
+    old_total_load = old_payload + user_data['current_bucket_weight'] + user_data['quick_hitch_weight']
+    new_total_load = optimal_bucket['total_bucket_weight']
+
+    dump_truck_payload_new, swings_to_fill_truck_new = new_passes
+    dump_truck_payload_old, swings_to_fill_truck_old = old_passes
+
+    # Time to fill truck in minutes
+    time_to_fill_truck_old = swings_to_fill_truck_old / machine_swings_per_minute
+    time_to_fill_truck_new = swings_to_fill_truck_new / machine_swings_per_minute
+
+    # Average number of trucks per hour at 75% efficiency
+    avg_trucks_per_hour_old = (60 / time_to_fill_truck_old) * 0.75 if time_to_fill_truck_old > 0 else 0
+    avg_trucks_per_hour_new = (60 / time_to_fill_truck_new) * 0.75 if time_to_fill_truck_new > 0 else 0
+
+    # Swings per hour
+    swings_per_hour_old = swings_to_fill_truck_old * avg_trucks_per_hour_old
+    swings_per_hour_new = swings_to_fill_truck_new * avg_trucks_per_hour_new
+
+    # Total swings per hour
+    total_swings_per_hour = 60 * machine_swings_per_minute
+
+    # Truck Tonnes per hour
+    truck_tonnage_per_hour_old = swings_per_hour_old * old_capacity * user_data['material_density'] / 1000
+    truck_tonnage_per_hour_new = swings_per_hour_new * new_capacity * user_data['material_density'] / 1000
+
+    # Production (t/hr)
+    total_tonnage_per_hour_old = total_swings_per_hour * old_capacity * user_data['material_density'] / 1000
+    total_tonnage_per_hour_new = total_swings_per_hour * new_capacity * user_data['material_density'] / 1000
+
+    # Production (t/hr)
+    tonnage_per_hour_old = avg_trucks_per_hour_old * dump_truck_payload_old / 1000
+    tonnage_per_hour_new = avg_trucks_per_hour_new * dump_truck_payload_new / 1000
+
+    # Assuming 1800 swings in a day
+    total_m3_per_day_old = 1000 * old_capacity
+    total_m3_per_day_new = 1000 * new_capacity
+
+    # Total tonnage per day
+    total_tonnage_per_day_old = total_m3_per_day_old * user_data['material_density'] / 1000
+    total_tonnage_per_day_new = total_m3_per_day_new * user_data['material_density'] / 1000
+
+    # Total number of trucks per day
+    total_trucks_per_day_old = total_tonnage_per_day_old / dump_truck_payload * 1000
+    total_trucks_per_day_new = total_tonnage_per_day_new / dump_truck_payload * 1000
+
+    productivity = (1.1 * total_tonnage_per_hour_new - total_tonnage_per_hour_old) / total_tonnage_per_hour_old * 100
+
+    return {
+        'old_capacity': old_capacity,
+        'new_capacity': new_capacity,
+        'old_payload': old_payload,
+        'new_payload': new_payload,
+        'dump_truck_payload': dump_truck_payload,
+        'old_total_load': old_total_load,
+        'new_total_load': new_total_load,
+        'dump_truck_payload_old': dump_truck_payload_old,
+        'dump_truck_payload_new': dump_truck_payload_new,
+        'swings_to_fill_truck_old': swings_to_fill_truck_old,
+        'swings_to_fill_truck_new': swings_to_fill_truck_new,
+        'time_to_fill_truck_old': time_to_fill_truck_old,
+        'time_to_fill_truck_new': time_to_fill_truck_new,
+        'avg_trucks_per_hour_old': avg_trucks_per_hour_old,
+        'avg_trucks_per_hour_new': avg_trucks_per_hour_new,
+        'swings_per_hour_old': swings_per_hour_old,
+        'swings_per_hour_new': swings_per_hour_new,
+        'total_swings_per_hour': total_swings_per_hour,
+        'truck_tonnage_per_hour_old': truck_tonnage_per_hour_old,
+        'truck_tonnage_per_hour_new': truck_tonnage_per_hour_new,
+        'total_tonnage_per_hour_old': total_tonnage_per_hour_old,
+        'total_tonnage_per_hour_new': total_tonnage_per_hour_new,
+        'tonnage_per_hour_old': tonnage_per_hour_old,
+        'tonnage_per_hour_new': tonnage_per_hour_new,
+        'total_m3_per_day_old': total_m3_per_day_old,
+        'total_m3_per_day_new': total_m3_per_day_new,
+        'total_tonnage_per_day_old': total_tonnage_per_day_old,
+        'total_tonnage_per_day_new': total_tonnage_per_day_new,
+        'total_trucks_per_day_old': total_trucks_per_day_old,
+        'total_trucks_per_day_new': total_trucks_per_day_new,
+        'productivity': productivity,
+    }
+
+
+# Candidate payloads per truck: 100% to 110% in 0.1% steps, plus one past the end
+ADJUST_STEPS = 102
+
+def adjust_payloads(dump_truck_payloads, payloads):
+    """Vectorised adjust_payload_for_new_bucket/_old_bucket (the two are the same).
+
+    Candidate payloads are built by repeated addition, as in the loop, so
+    results match it exactly. Returns (adjusted truck payloads, swings to
+    fill the truck) arrays.
+    """
+    dump_truck_payloads, payloads = np.broadcast_arrays(np.asarray(dump_truck_payloads, dtype=float),
+                                                        np.asarray(payloads, dtype=float))
+    max_payloads = dump_truck_payloads * 1.10
+    increments = dump_truck_payloads * 0.001
+    candidates = np.empty(dump_truck_payloads.shape + (ADJUST_STEPS,))
+    candidates[..., 0] = dump_truck_payloads
+    candidates[..., 1:] = increments[..., None]
+    np.add.accumulate(candidates, axis=-1, out=candidates)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        swings = candidates / payloads[..., None]
+        fallback_swings = dump_truck_payloads / payloads
+    # The loop stops at the first candidate above the maximum
+    within = np.logical_and.accumulate(candidates <= max_payloads[..., None], axis=-1)
+    ok = within & (np.abs(swings - np.ceil(swings)) <= 0.05)
+    first = ok.argmax(axis=-1)[..., None]
+    found = np.take_along_axis(ok, first, axis=-1)[..., 0]
+    adjusted = np.where(found, np.take_along_axis(candidates, first, axis=-1)[..., 0], dump_truck_payloads)
+    swings_to_fill = np.where(found, np.take_along_axis(swings, first, axis=-1)[..., 0], fallback_swings)
+    return adjusted, swings_to_fill
+
+def comparison_arrays(current_bucket_size, current_bucket_weight, material_density, quick_hitch_weight,
+                      dump_truck_payload, machine_swings_per_minute, new_bucket_size, new_total_bucket_weight,
+                      dump_truck_heaped=np.nan):
+    """Vectorised compute_comparison over arrays of inputs (scalars broadcast).
+
+    Returns a dict with the same keys as compute_comparison, holding arrays.
+    Divisions by zero give inf/NaN instead of raising.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        old_capacity = np.asarray(current_bucket_size, dtype=float)
+        new_capacity = np.asarray(new_bucket_size, dtype=float)
+        material_density = np.asarray(material_density, dtype=float)
+        old_payload = calculate_bucket_load(old_capacity, material_density)
+        new_payload = calculate_bucket_load(new_capacity, material_density)
+
+        dump_truck_payload, _ = truck_capacities(dump_truck_payload, dump_truck_heaped, material_density)
+        machine_swings_per_minute = np.asarray(machine_swings_per_minute, dtype=float)
+
+        old_total_load = old_payload + current_bucket_weight + quick_hitch_weight
+        new_total_load = np.asarray(new_total_bucket_weight, dtype=float)
+
+        dump_truck_payload_new, swings_to_fill_truck_new = adjust_payloads(dump_truck_payload, new_payload)
+        dump_truck_payload_old, swings_to_fill_truck_old = adjust_payloads(dump_truck_payload, old_payload)
+
+        time_to_fill_truck_old = swings_to_fill_truck_old / machine_swings_per_minute
+        time_to_fill_truck_new = swings_to_fill_truck_new / machine_swings_per_minute
+        avg_trucks_per_hour_old = np.where(time_to_fill_truck_old > 0, (60 / time_to_fill_truck_old) * 0.75, 0)
+        avg_trucks_per_hour_new = np.where(time_to_fill_truck_new > 0, (60 / time_to_fill_truck_new) * 0.75, 0)
+        swings_per_hour_old = swings_to_fill_truck_old * avg_trucks_per_hour_old
+        swings_per_hour_new = swings_to_fill_truck_new * avg_trucks_per_hour_new
+        total_swings_per_hour = 60 * machine_swings_per_minute
+        truck_tonnage_per_hour_old = swings_per_hour_old * old_capacity * material_density / 1000
+        truck_tonnage_per_hour_new = swings_per_hour_new * new_capacity * material_density / 1000
+        total_tonnage_per_hour_old = total_swings_per_hour * old_capacity * material_density / 1000
+        total_tonnage_per_hour_new = total_swings_per_hour * new_capacity * material_density / 1000
+        tonnage_per_hour_old = avg_trucks_per_hour_old * dump_truck_payload_old / 1000
+        tonnage_per_hour_new = avg_trucks_per_hour_new * dump_truck_payload_new / 1000
+        total_m3_per_day_old = 1000 * old_capacity
+        total_m3_per_day_new = 1000 * new_capacity
+        total_tonnage_per_day_old = total_m3_per_day_old * material_density / 1000
+        total_tonnage_per_day_new = total_m3_per_day_new * material_density / 1000
+        total_trucks_per_day_old = total_tonnage_per_day_old / dump_truck_payload * 1000
+        total_trucks_per_day_new = total_tonnage_per_day_new / dump_truck_payload * 1000
+        productivity = (1.1 * total_tonnage_per_hour_new - total_tonnage_per_hour_old) / total_tonnage_per_hour_old * 100
+
+    return {
+        'old_capacity': old_capacity,
+        'new_capacity': new_capacity,
+        'old_payload': old_payload,
+        'new_payload': new_payload,
+        'dump_truck_payload': dump_truck_payload,
+        'old_total_load': old_total_load,
+        'new_total_load': new_total_load,
+        'dump_truck_payload_old': dump_truck_payload_old,
+        'dump_truck_payload_new': dump_truck_payload_new,
+        'swings_to_fill_truck_old': swings_to_fill_truck_old,
+        'swings_to_fill_truck_new': swings_to_fill_truck_new,
+        'time_to_fill_truck_old': time_to_fill_truck_old,
+        'time_to_fill_truck_new': time_to_fill_truck_new,
+        'avg_trucks_per_hour_old': avg_trucks_per_hour_old,
+        'avg_trucks_per_hour_new': avg_trucks_per_hour_new,
+        'swings_per_hour_old': swings_per_hour_old,
+        'swings_per_hour_new': swings_per_hour_new,
+        'total_swings_per_hour': total_swings_per_hour,
+        'truck_tonnage_per_hour_old': truck_tonnage_per_hour_old,
+        'truck_tonnage_per_hour_new': truck_tonnage_per_hour_new,
+        'total_tonnage_per_hour_old': total_tonnage_per_hour_old,
+        'total_tonnage_per_hour_new': total_tonnage_per_hour_new,
+        'tonnage_per_hour_old': tonnage_per_hour_old,
+        'tonnage_per_hour_new': tonnage_per_hour_new,
+        'total_m3_per_day_old': total_m3_per_day_old,
+        'total_m3_per_day_new': total_m3_per_day_new,
+        'total_tonnage_per_day_old': total_tonnage_per_day_old,
+        'total_tonnage_per_day_new': total_tonnage_per_day_new,
+        'total_trucks_per_day_old': total_trucks_per_day_old,
+        'total_trucks_per_day_new': total_trucks_per_day_new,
+        'productivity': productivity,
+    }
+
+
+_MISSING = object()
+
+
+class _LRU:
+    """Small bounded, thread-safe memo table (sessions share one engine)."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+class BucketEngine:
+    """One loaded set of catalogues plus indexes and memoised results.
+
+    Results match the reference functions above; the SWL lookup and the
+    excavator class come from dictionaries built once, and bucket selection
+    and comparisons are memoised on their numeric inputs. ``version`` names
+    the catalogue the engine was built from and is stamped on its results.
+    """
+
+    def __init__(self, swl_data, bucket_data, bhc_bucket_data, dump_truck_data, cache_size=4096, version=None):
+        self.version = version
+        self.swl_data = swl_data
+        self.bucket_data = bucket_data
+        self.bhc_bucket_data = bhc_bucket_data
+        self.dump_truck_data = dump_truck_data
+
+        self._build_indexes()
+
+        self._bucket_cache = _LRU(cache_size)
+        self._arrays = {}
+        self._comparison_cache = _LRU(cache_size)
+
+    def _build_indexes(self):
+        # First matching row wins, as with iloc[0] in find_matching_swl
+        swl_data = self.swl_data
+        self.swl_index = {}
+        for key, swl in zip(swl_data[SWL_KEY_COLUMNS].itertuples(index=False, name=None), swl_data['swl']):
+            self.swl_index.setdefault(key, swl)
+        self.class_index = {}
+        for model, excavator_class in zip(swl_data['model'], swl_data['class']):
+            self.class_index.setdefault(model, excavator_class)
+
+    @classmethod
+    def from_csv(cls, swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv, **kwargs):
+        """Engine over a consistent snapshot of the CSVs, versioned by their content digest."""
+        digest, contents = read_sources([swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv])
+        kwargs.setdefault('version', digest[:16])
+        return cls(*load_catalogues(contents), **kwargs)
+
+    def buckets(self, select_bhc):
+        return self.bhc_bucket_data if select_bhc else self.bucket_data
+
+    def find_matching_swl(self, user_data):
+        return self.swl_index.get(tuple(user_data[field] for field in SWL_KEY_FIELDS))
+
+    def excavator_class(self, model):
+        return self.class_index[model]
+
+    def select_optimal_bucket(self, user_data, select_bhc, swl):
+        key = self._bucket_key(user_data, select_bhc, swl)
+        optimal_bucket = self._bucket_cache.get(key, _MISSING)
+        if optimal_bucket is _MISSING:
+            optimal_bucket = select_optimal_bucket(user_data, self.buckets(select_bhc), swl, self.swl_data)
+            self._bucket_cache.put(key, optimal_bucket)
+        return dict(optimal_bucket) if optimal_bucket else None
+
+    @staticmethod
+    def _bucket_key(user_data, select_bhc, swl):
+        return (bool(select_bhc), user_data['model'], user_data['material_density'], user_data['quick_hitch_weight'], swl)
+
+    def _bucket_arrays(self, select_bhc):
+        """Bucket catalogue columns as numpy arrays, built on first use."""
+        arrays = self._arrays.get(bool(select_bhc))
+        if arrays is None:
+            bucket_data = self.buckets(select_bhc)
+            arrays = {
+                'bucket_size': bucket_data['bucket_size'].to_numpy(dtype=float),
+                'bucket_weight': bucket_data['bucket_weight'].to_numpy(dtype=float),
+                'class': bucket_data['class'].to_numpy(dtype=float),
+                'bucket_name': bucket_data['bucket_name'].to_numpy(),
+                'bucket_weight_raw': bucket_data['bucket_weight'].to_numpy(),
+                'bucket_size_raw': bucket_data['bucket_size'].to_numpy(),
+            }
+            self._arrays[bool(select_bhc)] = arrays
+        return arrays
+
+    def select_optimal_buckets(self, user_datas, select_bhcs, swls):
+        """select_optimal_bucket for many requests at once.
+
+        Memoised requests are answered from the cache; the rest are evaluated
+        together with select_optimal_bucket_indices, one array pass per bucket
+        catalogue. Returns a list of optimal bucket dicts (or None).
+        """
+        results = [None] * len(user_datas)
+        misses = {False: [], True: []}
+        for i, (user_data, select_bhc, swl) in enumerate(zip(user_datas, select_bhcs, swls)):
+            cached = self._bucket_cache.get(self._bucket_key(user_data, select_bhc, swl), _MISSING)
+            if cached is _MISSING:
+                misses[bool(select_bhc)].append(i)
+            else:
+                results[i] = cached
+
+        for select_bhc, positions in misses.items():
+            if not positions:
+                continue
+            arrays = self._bucket_arrays(select_bhc)
+            indices, totals = select_optimal_bucket_indices(
+                arrays['bucket_size'], arrays['bucket_weight'], arrays['class'],
+                np.array([self.excavator_class(user_datas[i]['model']) for i in positions], dtype=float),
+                np.array([user_datas[i]['material_density'] for i in positions], dtype=float),
+                np.array([user_datas[i]['quick_hitch_weight'] for i in positions], dtype=float),
+                np.array([swls[i] for i in positions], dtype=float),
+            )
+            for i, index, total in zip(positions, indices, totals):
+                optimal_bucket = None
+                if index >= 0:
+                    optimal_bucket = {
+                        'bucket_name': arrays['bucket_name'][index],
+                        'bucket_size': arrays['bucket_size_raw'][index],
+                        'bucket_weight': arrays['bucket_weight_raw'][index],
+                        'total_bucket_weight': total
+                    }
+                self._bucket_cache.put(self._bucket_key(user_datas[i], select_bhc, swls[i]), optimal_bucket)
+                results[i] = optimal_bucket
+
+        return [dict(optimal_bucket) if optimal_bucket else None for optimal_bucket in results]
+
+    def _truck_arrays(self):
+        """Truck catalogue columns as numpy arrays, built on first use."""
+        arrays = self._arrays.get('trucks')
+        if arrays is None:
+            trucks = self.dump_truck_data
+            arrays = {
+                'brand': trucks['brand'].to_numpy(),
+                'type': trucks['type'].to_numpy(),
+                'model': trucks['model'].to_numpy(),
+                'payload': trucks['payload'].to_numpy(dtype=float),
+                'heaped': trucks[TRUCK_HEAPED_COLUMN].to_numpy(dtype=float),
+            }
+            self._arrays['trucks'] = arrays
+        return arrays
+
+    def recommend_trucks(self, user_data, optimal_bucket):
+        """Every truck in the catalogue ranked for this bucket, material and swing rate.
+
+        Each truck's capacity is its payload or, for light material, what its
+        heaped body holds. Pass matching is the app's (truck loads adjusted
+        by up to 10% for a whole number of passes), done for all trucks in
+        one array pass. Trucks are ranked by tonnes/hour counting whole
+        passes, so a truck that needs a part-filled last pass ranks below
+        one the bucket fills exactly; ties go to the better last-pass fill.
+        """
+        arrays = self._truck_arrays()
+        material_density = user_data['material_density']
+        bucket_payload = calculate_bucket_load(optimal_bucket['bucket_size'], material_density)
+        capacities, volume_limited = truck_capacities(arrays['payload'], arrays['heaped'], material_density)
+        truck_loads, swings = adjust_payloads(capacities, bucket_payload)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            passes = np.ceil(swings)
+            fill = swings / passes
+            trucks_per_hour = 60 * user_data['machine_swings_per_minute'] / passes * 0.75
+            tonnes_per_hour = trucks_per_hour * truck_loads / 1000
+
+        ranking = pd.DataFrame({
+            'brand': arrays['brand'],
+            'type': arrays['type'],
+            'model': arrays['model'],
+            'payload': arrays['payload'],
+            'heaped': arrays['heaped'],
+            'limited_by': np.where(volume_limited, 'volume', 'payload'),
+            'capacity': capacities,
+            'truck_load': truck_loads,
+            'swings': swings,
+            'passes': passes,
+            'last_pass_fill': fill,
+            'trucks_per_hour': trucks_per_hour,
+            'tonnes_per_hour': tonnes_per_hour,
+        })
+        ranking = ranking.sort_values(['tonnes_per_hour', 'last_pass_fill'], ascending=False, kind='stable',
+                                      na_position='last', ignore_index=True)
+        ranking.insert(0, 'rank', np.arange(1, len(ranking) + 1))
+        return ranking
+
+    def sweep(self, user_data, select_bhc=False, **grid):
+        """The whole calculation over every combination of ``grid`` values at once.
+
+        ``grid`` maps SWEEP_PARAMETERS names to sequences of values; the other
+        inputs come from ``user_data``. SWL is looked up once per distinct
+        reach, then bucket selection and the comparison run as single array
+        passes over the grid. Returns a DataFrame with one row per grid point
+        (first parameter varying slowest): the swept values, ``swl``, the
+        winning bucket and the compute_comparison numbers, missing (NaN)
+        where no bucket fits.
+        """
+        unknown = set(grid) - set(SWEEP_PARAMETERS)
+        if unknown:
+            raise ValueError(f"can't sweep {', '.join(sorted(unknown))}")
+        names = list(grid)
+        mesh = np.meshgrid(*[np.asarray(grid[name], dtype=float) for name in names], indexing='ij')
+        columns = {name: values.ravel() for name, values in zip(names, mesh)}
+        size = len(columns[names[0]]) if names else 1
+
+        def values(field):
+            return columns[field] if field in columns else np.full(size, float(user_data[field]))
+
+        if 'reach' in columns:
+            reaches, positions = np.unique(columns['reach'], return_inverse=True)
+            swl_by_reach = [self.find_matching_swl({**user_data, 'reach': reach}) for reach in reaches]
+            swls = np.array([np.nan if swl is None else swl for swl in swl_by_reach], dtype=float)[positions]
+        else:
+            swl = self.find_matching_swl(user_data)
+            swls = np.full(size, np.nan if swl is None else swl, dtype=float)
+
+        arrays = self._bucket_arrays(select_bhc)
+        material_density = values('material_density')
+        quick_hitch_weight = values('quick_hitch_weight')
+        indices, totals = select_optimal_bucket_indices(
+            arrays['bucket_size'], arrays['bucket_weight'], arrays['class'],
+            np.full(size, self.excavator_class(user_data['model']), dtype=float),
+            material_density, quick_hitch_weight, swls)
+        found = (indices >= 0) & (swls != 0)
+        chosen = np.maximum(indices, 0)
+
+        bucket_size = np.where(found, arrays['bucket_size'][chosen], np.nan)
+        total_bucket_weight = np.where(found, totals, np.nan)
+        comparison = comparison_arrays(
+            values('current_bucket_size'), values('current_bucket_weight'), material_density, quick_hitch_weight,
+            values('dump_truck_payload'), values('machine_swings_per_minute'), bucket_size, total_bucket_weight,
+            np.nan if user_data.get('dump_truck_heaped') is None else user_data['dump_truck_heaped'])
+
+        result = dict(columns)
+        result['swl'] = swls
+        result['bucket_name'] = np.where(found, arrays['bucket_name'][chosen], None)
+        result['bucket_size'] = bucket_size
+        result['bucket_weight'] = np.where(found, arrays['bucket_weight'][chosen], np.nan)
+        result['total_bucket_weight'] = total_bucket_weight
+        for key, array in comparison.items():
+            result[key] = np.where(found, np.broadcast_to(array, (size,)), np.nan)
+        return pd.DataFrame(result)
+
+    def compute_comparison(self, user_data, optimal_bucket):
+        key = (
+            user_data['current_bucket_size'], user_data['current_bucket_weight'], user_data['material_density'],
+            user_data['quick_hitch_weight'], user_data['dump_truck_payload'], user_data['machine_swings_per_minute'],
+            optimal_bucket['bucket_size'], optimal_bucket['total_bucket_weight'], user_data.get('dump_truck_heaped')
+        )
+        comparison = self._comparison_cache.get(key)
+        if comparison is None:
+            comparison = compute_comparison(user_data, optimal_bucket)
+            self._comparison_cache.put(key, comparison)
+        return dict(comparison)
+
+    def calculate(self, user_data, select_bhc=False):
+        """Run the whole calculation: SWL, optimal bucket and comparison numbers.
+
+        Returns None when the excavator configuration or a bucket within SWL
+        can't be found, otherwise a dict with ``swl``, ``optimal_bucket``,
+        ``comparison`` and the ``catalogue_version`` they were calculated from.
+        """
+        swl = self.find_matching_swl(user_data)
+        if not swl:
+            return None
+        optimal_bucket = self.select_optimal_bucket(user_data, select_bhc, swl)
+        if not optimal_bucket:
+            return None
+        return {
+            'swl': swl,
+            'optimal_bucket': optimal_bucket,
+            'comparison': self.compute_comparison(user_data, optimal_bucket),
+            'catalogue_version': self.version,
+        }
@@ -0,0 +1,166 @@
+"""Incremental what-if recalculation for one app session.
+
+The calculation is a small graph of named values. Each node lists the
+inputs (user_data fields, the engine, truck brand/model, select_bhc) or
+other nodes it depends on. ``get`` recomputes a node only when one of its
+dependencies has a different value than last time, and a node that
+recomputes to an equal value leaves the nodes below it alone. Nudging the
+material density re-runs the payloads and truck pass matching but not the
+SWL lookup; nudging swings per minute re-runs only the comparison
+arithmetic, tables and notes; an unchanged rerun costs a few dictionary
+lookups.
+"""
+
+from collections import Counter
+
+import pandas as pd
+
+from bucket_engine import (
+    SWL_KEY_FIELDS, adjust_payload_for_new_bucket, adjust_payload_for_old_bucket,
+    calculate_bucket_load, comparison_numbers, truck_capacity
+)
+from report_tables import build_comparison_data, notes_text
+
+
+class Node:
+    """A named value computed by ``func`` from ``deps``.
+
+    Values of nodes with ``keep=False`` are handed out but not held between
+    reruns, for large values that are cheap to rebuild and rarely needed.
+    """
+
+    def __init__(self, name, deps, func, keep=True):
+        self.name = name
+        self.deps = tuple(deps)
+        self.func = func
+        self.keep = keep
+
+
+def _same(a, b):
+    if a is b:
+        return True
+    if isinstance(a, float) and isinstance(b, float) and a != a and b != b:
+        return True  # NaN catalogue values
+    try:
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False  # e.g. DataFrames, compared by identity only
+
+
+class CalculationGraph:
+    """Lazily evaluated values that recompute only when their dependencies change."""
+
+    def __init__(self, nodes):
+        self.nodes = {node.name: node for node in nodes}
+        self.inputs = {}
+        self.recomputed = Counter()
+        self._cache = {}  # name -> [generation checked, dependency values, value]
+        self._generation = 0
+
+    def set_inputs(self, **inputs):
+        changed = [name for name, value in inputs.items()
+                   if name not in self.inputs or not _same(self.inputs[name], value)]
+        self.inputs.update(inputs)
+        if changed:
+            self._generation += 1
+        return changed
+
+    def get(self, name):
+        node = self.nodes.get(name)
+        if node is None:
+            return self.inputs[name]
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == self._generation:
+            return cached[2]
+
+        args = tuple(self.get(dep) for dep in node.deps)
+        if cached is not None and len(args) == len(cached[1]) and all(map(_same, args, cached[1])):
+            cached[0] = self._generation
+            return cached[2]
+
+        value = node.func(*args)
+        if node.keep:
+            self._cache[name] = [self._generation, args, value]
+        self.recomputed[name] += 1
+        return value
+
+    def values(self):
+        """Everything the graph holds on to: its inputs and kept node values.
+
+        Safe to call from another thread: both dicts are copied in one step before iterating.
+        """
+        cache = dict(self._cache)
+        return {**self.inputs, **{name: cached[2] for name, cached in cache.items()}}
+
+
+def _swl(engine, *key):
+    return engine.find_matching_swl(dict(zip(SWL_KEY_FIELDS, key)))
+
+
+def _optimal_bucket(engine, model, material_density, quick_hitch_weight, select_bhc, swl):
+    if not swl:
+        return None
+    user_data = {'model': model, 'material_density': material_density, 'quick_hitch_weight': quick_hitch_weight}
+    return engine.select_optimal_bucket(user_data, select_bhc, swl)
+
+
+def _truck_capacity(dump_truck_payload, dump_truck_heaped, material_density):
+    return truck_capacity({'dump_truck_payload': dump_truck_payload, 'dump_truck_heaped': dump_truck_heaped,
+                           'material_density': material_density})
+
+
+def _comparison(optimal_bucket, current_bucket_size, current_bucket_weight, material_density, quick_hitch_weight,
+                dump_truck_payload, dump_truck_heaped, machine_swings_per_minute, old_passes, new_passes):
+    user_data = {
+        'current_bucket_size': current_bucket_size, 'current_bucket_weight': current_bucket_weight,
+        'material_density': material_density, 'quick_hitch_weight': quick_hitch_weight,
+        'dump_truck_payload': dump_truck_payload, 'dump_truck_heaped': dump_truck_heaped,
+        'machine_swings_per_minute': machine_swings_per_minute,
+    }
+    return comparison_numbers(user_data, optimal_bucket, old_passes, new_passes)
+
+
+def _tables(comparison, material_density, truck_brand, truck_model):
+    # build_comparison_data reads only the density from user_data
+    return build_comparison_data({'material_density': material_density}, comparison, truck_brand, truck_model)
+
+
+def _frames(tables):
+    return tuple(pd.DataFrame(data) for data in tables)
+
+
+def _notes(optimal_bucket, swl, comparison, truck_brand, truck_model, material_density, dump_truck_payload,
+           dump_truck_heaped, *key):
+    user_data = dict(zip(SWL_KEY_FIELDS, key), material_density=material_density, dump_truck_payload=dump_truck_payload,
+                     dump_truck_heaped=dump_truck_heaped)
+    return notes_text(user_data, optimal_bucket, swl, comparison, truck_brand, truck_model)
+
+
+def comparison_graph():
+    """Graph of the app's calculation, from SWL lookup to the report tables and notes.
+
+    Inputs: ``engine``, the user_data fields, ``select_bhc``, ``truck_brand``
+    and ``truck_model``. Nodes: swl, optimal_bucket, old_payload,
+    new_bucket_size, new_payload, truck_payload, old_passes, new_passes,
+    comparison, tables, frames and notes. The report tables and DataFrames
+    are only needed for the PDF and are rebuilt from ``comparison`` when
+    asked for, so an idle session holds numbers and the notes text only.
+    """
+    return CalculationGraph([
+        Node('swl', ['engine', *SWL_KEY_FIELDS], _swl),
+        Node('optimal_bucket', ['engine', 'model', 'material_density', 'quick_hitch_weight', 'select_bhc', 'swl'],
+             _optimal_bucket),
+        Node('old_payload', ['current_bucket_size', 'material_density'], calculate_bucket_load),
+        Node('new_bucket_size', ['optimal_bucket'], lambda optimal_bucket: optimal_bucket['bucket_size']),
+        Node('new_payload', ['new_bucket_size', 'material_density'], calculate_bucket_load),
+        Node('truck_payload', ['dump_truck_payload', 'dump_truck_heaped', 'material_density'], _truck_capacity),
+        Node('old_passes', ['truck_payload', 'old_payload'], adjust_payload_for_old_bucket),
+        Node('new_passes', ['truck_payload', 'new_payload'], adjust_payload_for_new_bucket),
+        Node('comparison', ['optimal_bucket', 'current_bucket_size', 'current_bucket_weight', 'material_density',
+                            'quick_hitch_weight', 'dump_truck_payload', 'dump_truck_heaped',
+                            'machine_swings_per_minute', 'old_passes', 'new_passes'], _comparison),
+        Node('tables', ['comparison', 'material_density', 'truck_brand', 'truck_model'], _tables, keep=False),
+        Node('frames', ['tables'], _frames, keep=False),
+        Node('notes', ['optimal_bucket', 'swl', 'comparison', 'truck_brand', 'truck_model', 'material_density',
+                       'dump_truck_payload', 'dump_truck_heaped', *SWL_KEY_FIELDS], _notes),
+    ])
@@ -0,0 +1,109 @@
+"""Hot reload of the equipment catalogues without a redeploy.
+
+``CatalogueManager`` owns the engine a server process calculates with. A
+background thread polls the four CSVs; once a change has settled (the
+files look the same on two consecutive polls) it reads them as one
+consistent snapshot, parses them, builds the indexes, checks the columns
+the calculation needs and warms the new engine. Only then is the new
+engine swapped in, as a single attribute assignment.
+
+Callers take ``manager.engine`` once per request (per script run in the
+app, per batch in the API) and use that engine throughout, so a request
+sees either the old catalogue or the new one, never a mix, and never
+waits for a reload. Every result carries ``catalogue_version``. A reload
+that fails (half-copied file, missing column) is reported and the current
+version keeps serving until the files change again.
+
+BUCKET_CATALOGUE_POLL sets the poll interval in seconds (0 turns it off).
+With BUCKET_SHARED_CATALOGUE set, reloads publish and attach a new shared
+catalogue version (see shared_catalogue.py).
+"""
+
+import os
+import threading
+import time
+
+from bucket_engine import file_signature, validate_catalogues
+from shared_catalogue import engine_from_env
+
+POLL_INTERVAL = float(os.environ.get('BUCKET_CATALOGUE_POLL', 2.0))
+
+class CatalogueManager:
+    """Serves the current catalogue engine and swaps in new versions as the CSVs change."""
+
+    def __init__(self, swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv,
+                 prepare=None, poll_interval=POLL_INTERVAL):
+        self.paths = [swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv]
+        self.prepare = prepare
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._signature = file_signature(self.paths)
+        self._engine = self._build()
+
+        self._thread = None
+        if poll_interval:
+            self._thread = threading.Thread(target=self._watch, name='catalogue-watch', daemon=True)
+            self._thread.start()
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @property
+    def version(self):
+        return self._engine.version
+
+    def _build(self):
+        engine = engine_from_env(*self.paths)
+        validate_catalogues(engine.swl_data, engine.bucket_data, engine.bhc_bucket_data, engine.dump_truck_data)
+        if self.prepare is not None:
+            self.prepare(engine)
+        return engine
+
+    def reload(self):
+        """Build the catalogue from the files as they are now and swap it in.
+
+        Returns True if a new version was swapped in. Serving continues on
+        the current engine while this runs.
+        """
+        with self._reload_lock:
+            signature = file_signature(self.paths)
+            start = time.monotonic()
+            try:
+                engine = self._build()
+            except Exception as e:
+                self.failed_reloads += 1
+                self.last_error = f'{type(e).__name__}: {e}'
+                self._signature = signature  # Don't retry until the files change again
+                print(f"Catalogue reload failed, still serving {self.version}: {self.last_error}")
+                return False
+            self._signature = signature
+            if engine.version == self.version:
+                return False
+            previous, self._engine = self.version, engine
+            self.reloads += 1
+            self.last_error = None
+            print(f"Catalogue reloaded: {previous} -> {engine.version} in {time.monotonic() - start:.2f}s")
+            return True
+
+    def _watch(self):
+        pending = None
+        while not self._stop.wait(self.poll_interval):
+            signature = file_signature(self.paths)
+            if signature == self._signature or None in signature:
+                pending = None
+            elif signature != pending:
+                pending = signature  # Changed since the last poll; wait for the writer to finish
+            else:
+                pending = None
+                self.reload()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
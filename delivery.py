@@ -0,0 +1,119 @@
+"""Delivery of the comparison report: SendGrid email and HubSpot contacts.
+
+API hosts can be pointed at local stand-ins (see stand_ins.py) with the
+SENDGRID_API_HOST and HUBSPOT_API_HOST environment variables. Rendering
+and sending the report runs on a small background pool (``submit``) so a
+slow SendGrid never holds up a calculation.
+"""
+
+import base64
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import sendgrid
+from sendgrid.helpers.mail import Mail, Email, To, Content, Attachment
+
+from pdf_report import generate_pdf
+from tracing import traced
+
+SENDGRID_API_HOST = os.environ.get('SENDGRID_API_HOST', 'https://api.sendgrid.com')
+HUBSPOT_API_HOST = os.environ.get('HUBSPOT_API_HOST', 'https://api.hubspot.com')
+DELIVERY_WORKERS = int(os.environ.get('BUCKET_DELIVERY_WORKERS', 8))
+HUBSPOT_TIMEOUT = 10
+
+EMAIL_SUBJECT = "Your ONTRAC XMOR® Bucket Comparison Results"
+EMAIL_BODY = "Please find the attached PDF with your results!\n\nThank you for using ONTRAC'S Bucket comparison tool, we hope to hear from you soon!"
+PDF_FILE_NAME = 'ONTRAC XMOR® Bucket Comparison.pdf'
+
+def build_pdf_email(from_email, email, pdf_content):
+    """Build the SendGrid Mail with the PDF bytes attached."""
+    # Create the email components
+    from_email = Email(from_email)
+    to_email = To(email)
+    content = Content("text/plain", EMAIL_BODY)
+
+    # Create the email object
+    mail = Mail(from_email, to_email, EMAIL_SUBJECT, content)
+
+    # Encode the PDF as base64
+    encoded_file = base64.b64encode(pdf_content).decode('utf-8')
+
+    # Create the attachment object
+    attachment = Attachment(
+        file_content=encoded_file,
+        file_type='application/pdf',
+        file_name=PDF_FILE_NAME,
+        disposition='attachment'
+    )
+
+    # Attach the file to the email
+    mail.add_attachment(attachment)
+    return mail
+
+@traced('send_email_with_pdf')
+def send_email_with_pdf(email, pdf_file, sendgrid_api_key, from_email, host=None):
+    """Send the PDF file via email. Returns True if SendGrid accepted it."""
+    # Create the SendGrid client
+    sg = sendgrid.SendGridAPIClient(api_key=sendgrid_api_key, host=host or SENDGRID_API_HOST)
+
+    mail = build_pdf_email(from_email, email, pdf_file.read())
+
+    # Send the email
+    try:
+        response = sg.send(mail)
+        if response.status_code == 202:
+            print("Email sent successfully")
+            return True
+        print(f"Failed to send email: Status code {response.status_code}")
+    except Exception as e:
+        print(f"Failed to send email: {e}")
+    return False
+
+def email_pdf_report(email, report_args, sendgrid_api_key, from_email, host=None):
+    """Render the PDF report from generate_pdf's arguments and email it."""
+    pdf_file = generate_pdf(*report_args)
+    return send_email_with_pdf(email, pdf_file, sendgrid_api_key, from_email, host=host)
+
+@traced('add_contact_to_hubspot')
+def add_contact_to_hubspot(email, hubspot_api_key, host=None):
+    """Adds a contact to HubSpot. Returns the response status code."""
+    url = f"{host or HUBSPOT_API_HOST}/crm/v3/objects/contacts"
+    headers = {
+        "Authorization": f"Bearer {hubspot_api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "properties": {
+            "email": email
+        }
+    }
+    response = requests.post(url, headers=headers, json=data, timeout=HUBSPOT_TIMEOUT)
+    if response.status_code == 201:
+        print(f"Successfully added {email} to HubSpot!")
+    elif response.status_code == 409:
+        print(f"The email {email} already exists in HubSpot.")
+    else:
+        print(f"Failed to add {email}. Status code {response.status_code}")
+    return response.status_code
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _report_failure(future):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        print(f"Background delivery failed: {error}")
+
+def submit(func, *args, **kwargs):
+    """Run a delivery task on the background pool and return its Future."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DELIVERY_WORKERS, thread_name_prefix='delivery')
+    future = _executor.submit(func, *args, **kwargs)
+    future.add_done_callback(_report_failure)
+    return future
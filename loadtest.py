@@ -0,0 +1,213 @@
+"""Load test the calculate-and-email flow with concurrent virtual users.
+
+Each virtual user repeatedly does what a page visit does: calculate a
+comparison (SWL lookup, bucket selection, comparison numbers, tables and
+notes), then deliver it the way the app does (delivery.email_pdf_report
+renders the PDF and sends it through SendGrid, then the contact is added
+to HubSpot). SendGrid and HubSpot are local stand-ins with
+configurable latency and error injection (stand_ins.py).
+
+Delivery goes through the app's background pool (delivery.submit) unless
+``--blocking-delivery`` is given, in which case the user waits for it as
+the app used to. Running both ways shows whether slow email/CRM calls
+still hold up calculations:
+
+    python loadtest.py --users 50 --duration 30 --sendgrid-latency 1.0
+    python loadtest.py --users 50 --duration 30 --sendgrid-latency 1.0 --blocking-delivery
+
+The report gives throughput, error counts and p50/p95/p99 per stage.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import wait
+
+import pandas as pd
+from reportlab.platypus import Paragraph
+
+import delivery
+from benchmark import sample_user_data, synthetic_catalogues
+from bucket_engine import BucketEngine
+from pdf_report import get_pdf_styles
+from report_tables import build_comparison_data, notes_text
+from stand_ins import StandInServer, add_service_arguments, configs_from_args
+from tracing import Tracer, format_summary
+
+SENDGRID_API_KEY = 'SG.loadtest'
+HUBSPOT_API_KEY = 'loadtest'
+FROM_EMAIL = 'loadtest@example.com'
+
+
+class LoadTest:
+    def __init__(self, engine, samples, stand_in_url, blocking_delivery=False, think_time=0.0):
+        self.engine = engine
+        self.samples = samples
+        self.stand_in_url = stand_in_url
+        self.blocking_delivery = blocking_delivery
+        self.think_time = think_time
+        self.tracer = Tracer(enabled=True, window=1_000_000)
+        self.counts = {'calculations': 0, 'no_result': 0, 'calculation_errors': 0,
+                       'deliveries': 0, 'email_failures': 0, 'hubspot_failures': 0, 'delivery_errors': 0}
+        self._lock = threading.Lock()
+        self._futures = []
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def calculate(self, user_data):
+        """Everything the page does before it can show results."""
+        result = self.engine.calculate(user_data)
+        if not result:
+            return None
+        brand, model = user_data['truck_brand'], user_data['truck_model']
+        tables = build_comparison_data(user_data, result['comparison'], brand, model)
+        frames = [pd.DataFrame(data) for data in tables]
+        paragraph = Paragraph(
+            notes_text(user_data, result['optimal_bucket'], result['swl'], result['comparison'], brand, model),
+            get_pdf_styles()['Normal'])
+        return (paragraph, *frames, user_data, result['swl'])
+
+    def deliver(self, email, report_args):
+        """The app's delivery: delivery.email_pdf_report, then the HubSpot contact."""
+        span = self.tracer.span
+        try:
+            with span('delivery'):
+                with span('email_pdf_report'):
+                    sent = delivery.email_pdf_report(email, report_args, SENDGRID_API_KEY, FROM_EMAIL,
+                                                     host=self.stand_in_url)
+                with span('add_contact_to_hubspot'):
+                    status = delivery.add_contact_to_hubspot(email, HUBSPOT_API_KEY, host=self.stand_in_url)
+        except Exception:
+            self._count('delivery_errors')
+            raise
+        self._count('deliveries')
+        if not sent:
+            self._count('email_failures')
+        if status not in (201, 409):
+            self._count('hubspot_failures')
+
+    def virtual_user(self, user_id, deadline):
+        span = self.tracer.span
+        i = user_id
+        while time.monotonic() < deadline:
+            user_data = self.samples[i % len(self.samples)]
+            email = f'user{user_id}.{i}@example.com'
+            i += 1
+            try:
+                with span('request'):
+                    with span('calculate'):
+                        report_args = self.calculate(user_data)
+                    if report_args is None:
+                        self._count('no_result')
+                        continue
+                    self._count('calculations')
+                    if self.blocking_delivery:
+                        try:
+                            self.deliver(email, report_args)
+                        except Exception:
+                            pass  # Counted in deliver
+                    else:
+                        future = delivery.submit(self.deliver, email, report_args)
+                        with self._lock:
+                            self._futures.append(future)
+            except (ArithmeticError, KeyError, ValueError):
+                self._count('calculation_errors')
+            if self.think_time:
+                time.sleep(self.think_time)
+
+    def run(self, users, duration, drain_timeout=60.0):
+        deadline = time.monotonic() + duration
+        start = time.monotonic()
+        threads = [threading.Thread(target=self.virtual_user, args=(n, deadline), name=f'vu-{n}')
+                   for n in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        load_seconds = time.monotonic() - start
+
+        with self._lock:
+            futures = list(self._futures)
+        backlog = sum(1 for future in futures if not future.done())
+        # Give queued deliveries some time to finish, then drop whatever hasn't started
+        # and wait for the sends already in flight
+        _, pending = wait(futures, timeout=drain_timeout)
+        undelivered = sum(1 for future in pending if future.cancel())
+        wait(pending)
+        total_seconds = time.monotonic() - start
+
+        return {
+            'users': users,
+            'blocking_delivery': self.blocking_delivery,
+            'load_seconds': load_seconds,
+            'total_seconds': total_seconds,
+            'calculations_per_second': self.counts['calculations'] / load_seconds,
+            'deliveries_per_second': self.counts['deliveries'] / total_seconds,
+            'delivery_backlog_at_end': backlog,
+            'undelivered': undelivered,
+            'counts': dict(self.counts),
+            'stages': self.tracer.summary(),
+        }
+
+
+def format_report(report, stand_in_stats):
+    lines = [
+        f"Virtual users:          {report['users']} ({'blocking' if report['blocking_delivery'] else 'background'} delivery)",
+        f"Load duration:          {report['load_seconds']:.1f}s (+{report['total_seconds'] - report['load_seconds']:.1f}s draining deliveries)",
+        f"Calculations:           {report['counts']['calculations']} ({report['calculations_per_second']:.1f}/s)",
+        f"Deliveries:             {report['counts']['deliveries']} ({report['deliveries_per_second']:.1f}/s), "
+        f"backlog at end of load {report['delivery_backlog_at_end']}, dropped after drain timeout {report['undelivered']}",
+        f"Failures:               email {report['counts']['email_failures']}, hubspot {report['counts']['hubspot_failures']}, "
+        f"delivery errors {report['counts']['delivery_errors']}, calculation errors {report['counts']['calculation_errors']}",
+        f"Stand-in responses:     {json.dumps(stand_in_stats)}",
+        '',
+        format_summary(report['stages']),
+    ]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the calculate-and-email flow')
+    parser.add_argument('--users', type=int, default=20, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of load')
+    parser.add_argument('--think-time', type=float, default=0.5, help='seconds each user pauses between requests')
+    parser.add_argument('--drain-timeout', type=float, default=30.0,
+                        help='seconds to wait for queued deliveries after the load stops')
+    parser.add_argument('--blocking-delivery', action='store_true', help='deliver on the user thread')
+    parser.add_argument('--delivery-workers', type=int, default=delivery.DELIVERY_WORKERS,
+                        help='size of the background delivery pool')
+    parser.add_argument('--scale', type=int, default=1, help='synthetic catalogue scale factor')
+    parser.add_argument('--samples', type=int, default=200, help='distinct calculation inputs to cycle through')
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--verbose', action='store_true', help="show the app's per-request delivery prints")
+    add_service_arguments(parser)
+    args = parser.parse_args(argv)
+
+    swl_data, bucket_data, bhc_bucket_data, dump_truck_data = synthetic_catalogues(args.scale)
+    engine = BucketEngine(swl_data, bucket_data, bhc_bucket_data, dump_truck_data)
+    samples = sample_user_data(swl_data, dump_truck_data, count=args.samples)
+    delivery.DELIVERY_WORKERS = args.delivery_workers
+
+    sendgrid_config, hubspot_config = configs_from_args(args)
+    with StandInServer(sendgrid_config, hubspot_config) as server:
+        load_test = LoadTest(engine, samples, server.url, args.blocking_delivery, args.think_time)
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            report = load_test.run(args.users, args.duration, args.drain_timeout)
+        stand_in_stats = server.stats()
+
+    print(format_report(report, stand_in_stats))
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({**report, 'stand_ins': stand_in_stats, 'args': vars(args)}, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""PDF rendering of the bucket comparison report.
+
+By default reports are rendered compact: content streams are Flate
+compressed without the ASCII85 layer ReportLab puts on top (the email
+base64-encodes the file anyway), the output is invariant (no timestamps
+or random IDs) and finished PDFs are kept in a content-addressed cache
+keyed on the table cells and notes, so an identical comparison is never
+rendered twice. BUCKET_PDF_COMPACT=0 renders them the way they used to
+be; ``python benchmark.py --only "pdf_*" "email_*"`` compares the two.
+"""
+
+import contextlib
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import pandas as pd
+from reportlab import rl_config
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+
+from report_tables import build_comparison_data, notes_text
+from tracing import traced
+
+PDF_COMPACT = os.environ.get('BUCKET_PDF_COMPACT', '1') != '0'
+PDF_CACHE_MB = float(os.environ.get('BUCKET_PDF_CACHE_MB', 32))
+PDF_CACHE_DIR = os.environ.get('BUCKET_PDF_CACHE_DIR')
+SECTION_HEADINGS = [
+    "Side-by-Side Bucket Comparison",
+    "Loadout Productivity & Truck Pass Simulation",
+    "1000 Swings Comparison",
+    "10% Improved Cycle Time Comparison",
+]
+SPACE_AFTER_TABLES = [8, 8, 8, 62]
+
+# rl_config.useA85 is process-wide and read while a document builds, so renders take turns
+# setting it (they hold the GIL for nearly all of their time anyway)
+_render_lock = threading.Lock()
+
+@contextlib.contextmanager
+def _stream_encoding(compact):
+    """Compact renders leave out the ASCII85 layer (streams stay Flate compressed); restored afterwards."""
+    with _render_lock:
+        use_a85 = rl_config.useA85
+        if compact:
+            rl_config.useA85 = 0
+        try:
+            yield
+        finally:
+            rl_config.useA85 = use_a85
+
+@lru_cache(maxsize=None)
+def get_pdf_styles():
+    """Return the dark mode report stylesheet, built once and shared by every report."""
+    styles = getSampleStyleSheet()
+    
+    # Title style
+    title_style = styles['Title']
+    title_style.fontName = 'Helvetica-Bold'
+    title_style.fontSize = 24  # Larger font for the title
+    title_style.textColor = colors.HexColor("#ffffff")  # White title color
+    
+    # Heading 1 style
+    heading_style = styles['Heading1']
+    heading_style.fontName = 'Helvetica-Bold'
+    heading_style.fontSize = 16  # Bigger heading font size
+    heading_style.textColor = colors.HexColor("#f4c542")  # Orange heading color
+    
+    # Subheading style
+    subheading_style = styles['Heading2']
+    subheading_style.fontName = 'Helvetica-Bold'
+    subheading_style.fontSize = 14
+    subheading_style.textColor = colors.HexColor("#f4c542")  # Orange subheading color
+    
+    # Normal body text style
+    normal_style = styles['Normal']
+    normal_style.fontName = 'Helvetica'
+    normal_style.fontSize = 12  # Slightly larger font size for normal content
+    normal_style.textColor = colors.HexColor("#e0e0e0")  # Light gray text color for dark mode
+
+    return styles
+
+@lru_cache(maxsize=None)
+def get_table_style(rows):
+    """Table style for a report table of ``rows`` rows (header included), built once per row count."""
+    commands = [
+        # Header row styles
+        #('LINEABOVE', (0, 0), (-1, 0), 1.5, colors.HexColor("#f4c542")),  # Line above header
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#2a2a2a")),  # Dark background for header
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#ffffff")),  # White text for header
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),  # Bold font for header
+        ('FONTSIZE', (0, 0), (-1, 0), 11),  # Font size for header
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),  # Horizontally center text in header
+        ('PADDING', (0, 0), (-1, 0), 35),  # Padding for header row only
+
+        # Body row styles
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor("#2a2a2a")),  # Dark background for body
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.HexColor("#e0e0e0")),  # Light text color for body
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),  # Regular font for body
+        ('FONTSIZE', (0, 1), (-1, -1), 11),  # Font size for body rows
+        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),  # Center align body content
+        ('PADDING', (0, 1), (-1, -1), 35),  # Padding for body rows
+
+        # Gridlines
+        ('GRID', (0, 0), (-1, -1), 1.5, colors.HexColor("#333333")),  # Grid lines for the whole table
+    ]
+    # Alternating row colors for body rows (after the body background)
+    commands += [('BACKGROUND', (0, i), (-1, i), colors.HexColor("#2f2f2f")) for i in range(2, rows, 2)]
+    return TableStyle(commands)
+
+def report_key(paragraph, frames):
+    """Content address of a report: a hash of everything that ends up on the page."""
+    content = [paragraph.style.name, paragraph.text] + [[df.columns.to_list(), df.values.tolist()] for df in frames]
+    return hashlib.sha256(json.dumps(content, default=str).encode('utf-8')).hexdigest()
+
+class PdfCache:
+    """LRU of rendered PDFs by content address, bounded by total size.
+
+    With ``directory`` set, PDFs are also stored there as <key>.pdf so
+    other processes (API workers, batch runs) reuse them.
+    """
+
+    def __init__(self, max_bytes, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._pdfs = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._pdfs.get(key)
+            if pdf is not None:
+                self._pdfs.move_to_end(key)
+                self.hits += 1
+                return pdf
+        if self.directory:
+            try:
+                with open(os.path.join(self.directory, f'{key}.pdf'), 'rb') as f:
+                    pdf = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                self._remember(key, pdf)
+                with self._lock:
+                    self.hits += 1
+                return pdf
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, pdf):
+        self._remember(key, pdf)
+        if self.directory:
+            path = os.path.join(self.directory, f'{key}.pdf')
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(pdf)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Failed to store PDF in {self.directory}: {e}")
+
+    def _remember(self, key, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._pdfs:
+                return
+            self._pdfs[key] = pdf
+            self._size += len(pdf)
+            while self._size > self.max_bytes:
+                _, evicted = self._pdfs.popitem(last=False)
+                self._size -= len(evicted)
+
+pdf_cache = PdfCache(int(PDF_CACHE_MB * 1024 * 1024), PDF_CACHE_DIR)
+
+def render_pdf(paragraph, frames, compact=True):
+    """Build the report PDF and return its bytes."""
+    pdf_output = io.BytesIO()
+
+    # Create the PDF document; compact output is invariant so equal reports are equal bytes
+    doc = SimpleDocTemplate(pdf_output, pagesize=letter, invariant=1 if compact else None)
+
+    # Set background color for the entire page (dark mode)
+    def add_dark_mode_background(canvas, doc):
+        canvas.setFillColor(colors.HexColor("#1f1f1f"))  # Dark background color
+        canvas.rect(0, 0, doc.pagesize[0], doc.pagesize[1], fill=1)  # Fill the page
+
+    elements = []  # List of all elements to be added to the PDF
+
+    # Set up document styles (built once per process)
+    styles = get_pdf_styles()
+    title_style = styles['Title']
+    heading_style = styles['Heading1']
+
+    # 1️⃣ Add Title
+    elements.append(Paragraph("ONTRAC XMOR® Bucket Comparison", title_style))
+    elements.append(Spacer(1, 12))  # Space below the title
+
+    # 2️⃣ Add the four comparison sections, each an underlined heading and its table
+    for heading, df, space_after in zip(SECTION_HEADINGS, frames, SPACE_AFTER_TABLES):
+        elements.append(Paragraph(f"<u>{heading}</u>", heading_style))
+
+        # Column names as the header row (no redundant title row)
+        table_data = [df.columns.to_list()] + df.values.tolist()
+        table = Table(table_data)
+        table.setStyle(get_table_style(len(table_data)))
+        elements.append(table)
+        elements.append(Spacer(1, space_after))
+
+    # 3️⃣ Add Section: Detailed Notes and Calculations
+    elements.append(Paragraph("<u>Notes</u>", heading_style))  # Underlined heading
+    elements.append(paragraph)
+    elements.append(Spacer(1, 12))  # Adjust spacing as needed
+
+    # Build the document with dark mode background applied
+    with _stream_encoding(compact):
+        doc.build(elements, onFirstPage=add_dark_mode_background, onLaterPages=add_dark_mode_background)
+    return pdf_output.getvalue()
+
+@traced('generate_pdf')
+def generate_pdf(paragraph, side_by_side_df, loadout_productivity_df, swings_simulation_df, improved_cycle_df, user_data, swl,
+                 compact=None):
+    """Generate a polished PDF with user results and separate tables for each section.
+
+    Returns a BytesIO positioned at the start. Compact reports (the default,
+    see BUCKET_PDF_COMPACT) come from the PDF cache when the same report
+    was rendered before.
+    """
+    frames = [side_by_side_df, loadout_productivity_df, swings_simulation_df, improved_cycle_df]
+    if compact is None:
+        compact = PDF_COMPACT
+    if not compact:
+        return io.BytesIO(render_pdf(paragraph, frames, compact=False))
+
+    key = report_key(paragraph, frames)
+    pdf = pdf_cache.get(key)
+    if pdf is None:
+        pdf = render_pdf(paragraph, frames)
+        pdf_cache.put(key, pdf)
+    return io.BytesIO(pdf)
+
+def render_report(user_data, result, truck_brand='', truck_model=''):
+    """PDF bytes of the report for one calculation ``result`` (swl, optimal_bucket, comparison)."""
+    tables = build_comparison_data(user_data, result['comparison'], truck_brand, truck_model)
+    frames = [pd.DataFrame(data) for data in tables]
+    paragraph = Paragraph(
+        notes_text(user_data, result['optimal_bucket'], result['swl'], result['comparison'], truck_brand, truck_model),
+        get_pdf_styles()['Normal'])
+    return generate_pdf(paragraph, *frames, user_data, result['swl']).getvalue()
@@ -0,0 +1,250 @@
+"""Comparison table data, report notes and HTML tables for the bucket comparison."""
+
+def generate_html_table(data, title):
+    """
+    Generate a simple HTML table from a dictionary where keys are column headers
+    and values are lists of data. The table will have a dynamic title, styled for dark mode.
+    """
+    # Extract headers dynamically from the keys of the data dictionary
+    headers = list(data.keys())
+    
+    # Find the maximum length of the lists (rows) in the data dictionary
+    num_rows = max(len(data[header]) for header in headers)
+    
+    # Start the HTML table structure with fixed table width
+    html = """
+    <style>
+        /* Global styles for Dark Mode */
+        body {
+            background-color: #121212; /* Dark background for the body */
+            color: #e0e0e0; /* Light text for dark mode */
+            font-family: Arial, sans-serif;
+            margin: 0;
+            padding: 20px;
+        }
+        table {
+            width: 100%; /* Set a fixed width for the table */
+            margin: 0 auto; /* Center the table horizontally */
+            border-collapse: collapse;
+            font-size: 16px;
+            text-align: left;
+            background-color: #1e1e1e; /* Table background for dark mode */
+            color: #e0e0e0; /* Light text for table content */
+            border-radius: 8px; /* Rounded corners for modern look */
+        }
+        th, td {
+            padding: 12px 15px;
+            border: 1px solid #333; /* Border color for dark mode */
+            text-align: center; /* Centered text for better readability */
+        }
+        th {
+            background-color: #1e1e1e; /* Pale yellow-orange color for headers */
+            color: #ffffff; /* White text for headers */
+            font-weight: bold;
+        }
+        tr:nth-child(even) {
+            background-color: #2a2a2a; /* Slightly lighter row for contrast */
+        }
+        tr:nth-child(odd) {
+            background-color: #1e1e1e; /* Darker odd rows */
+        }
+        tr:hover {
+            background-color: #444; /* Highlight row on hover */
+        }
+        h3 {
+            font-size: 22px;
+            color: #f4c542; /* Orange color for the title */
+            font-weight: bold;
+            border-bottom: 2px solid #f4c542;
+            padding-bottom: 5px;
+            margin-bottom: 5px; /* Reduced margin to remove gap */
+        }
+        /* Optionally style the container for better layout */
+        .table-container {
+            background-color: #181818;
+            padding: 15px;
+            border-radius: 10px;
+        }
+    </style>
+    """
+    
+    # Use the title for both the h3 and table
+    html += f"<h3>{title}</h3>"
+    html += '<div class="table-container">'
+    html += "<table><thead><tr>"
+    
+    # Add table headers
+    for header in headers:
+        html += f"<th>{header}</th>"
+    
+    html += "</tr></thead><tbody>"
+    
+    # Add rows to the table, ensuring to handle any missing data gracefully
+    for i in range(num_rows):
+        html += "<tr>"
+        for header in headers:
+            value = data[header][i] if i < len(data[header]) else ""
+            html += f"<td>{value}</td>"
+        html += "</tr>"
+    
+    html += "</tbody></table>"
+    html += "</div>"
+    
+    return html
+
+def build_comparison_data(user_data, comparison, truck_brand, truck_model):
+    """Build the four comparison tables as {column header: [cells]} dicts.
+
+    Returns side-by-side, loadout productivity, 1000 swings and 10% improved
+    cycle time data, formatted exactly as shown in the app and the PDF.
+    """
+    old_capacity, new_capacity = comparison['old_capacity'], comparison['new_capacity']
+    old_payload, new_payload = comparison['old_payload'], comparison['new_payload']
+    dump_truck_payload = comparison['dump_truck_payload']
+    old_total_load, new_total_load = comparison['old_total_load'], comparison['new_total_load']
+    dump_truck_payload_old, dump_truck_payload_new = comparison['dump_truck_payload_old'], comparison['dump_truck_payload_new']
+    swings_to_fill_truck_old, swings_to_fill_truck_new = comparison['swings_to_fill_truck_old'], comparison['swings_to_fill_truck_new']
+    time_to_fill_truck_old, time_to_fill_truck_new = comparison['time_to_fill_truck_old'], comparison['time_to_fill_truck_new']
+    avg_trucks_per_hour_old, avg_trucks_per_hour_new = comparison['avg_trucks_per_hour_old'], comparison['avg_trucks_per_hour_new']
+    swings_per_hour_old, swings_per_hour_new = comparison['swings_per_hour_old'], comparison['swings_per_hour_new']
+    truck_tonnage_per_hour_old, truck_tonnage_per_hour_new = comparison['truck_tonnage_per_hour_old'], comparison['truck_tonnage_per_hour_new']
+    total_m3_per_day_old, total_m3_per_day_new = comparison['total_m3_per_day_old'], comparison['total_m3_per_day_new']
+    total_tonnage_per_day_old, total_tonnage_per_day_new = comparison['total_tonnage_per_day_old'], comparison['total_tonnage_per_day_new']
+    total_trucks_per_day_old, total_trucks_per_day_new = comparison['total_trucks_per_day_old'], comparison['total_trucks_per_day_new']
+
+    # Side-by-Side Bucket Comparison Data
+    side_by_side_data = {
+        '                Description                ': [
+             'Capacity (m³)', 'Material Density (kg/m³)', 'Bucket Payload (kg)', 
+            'Total Suspended Load (kg)'
+        ],
+        'Old Bucket': [
+             f"{old_capacity:.1f}", f"{user_data['material_density']:.0f}", f"{old_payload:.0f}", 
+            f"{old_total_load:.0f}"
+        ],
+        'XMOR® Bucket': [
+             f"{new_capacity:.1f}", f"{user_data['material_density']:.0f}", f"{new_payload:.0f}", 
+            f"{new_total_load:.0f}"
+        ],
+        'Difference': [
+             f"{new_capacity - old_capacity:.1f}", '-', f"{new_payload - old_payload:.0f}", 
+            f"{new_total_load - old_total_load:.0f}"
+        ],
+        '% Difference': [
+             f"{(new_capacity - old_capacity) / old_capacity * 100:.0f}%", '-', f"{(new_payload - old_payload) / old_payload * 100:.0f}%", 
+            f"{(new_total_load - old_total_load) / old_total_load * 100:.0f}%"
+        ]
+    }
+    
+    # Loadout Productivity & Truck Pass Simulation Data
+    loadout_productivity_data = {
+        '                Description                ': [
+             f"{truck_brand} {truck_model} Payload (kg)", 'Avg No. Swings to Fill Truck', 
+            'Time to Fill Truck (min)', 'Avg Trucks/Hour @ 75% eff', 'Swings/Hour', 'Tonnes/Hour'
+        ],
+        'Old Bucket': [
+             f"{dump_truck_payload_old:.0f}{'*' if dump_truck_payload_old != dump_truck_payload else ''}", f"{swings_to_fill_truck_old:.1f}", 
+            f"{time_to_fill_truck_old:.1f}", f"{avg_trucks_per_hour_old:.1f}", f"{swings_per_hour_old:.0f}", f"{truck_tonnage_per_hour_old:.0f}"
+        ],
+        'XMOR® Bucket': [
+             f"{dump_truck_payload_new:.0f}{'*' if dump_truck_payload_new != dump_truck_payload else ''}", f"{swings_to_fill_truck_new:.1f}", 
+            f"{time_to_fill_truck_new:.1f}", f"{avg_trucks_per_hour_new:.1f}", f"{swings_per_hour_new:.0f}", f"{truck_tonnage_per_hour_new:.0f}"
+        ],
+        'Difference': [
+             f"{dump_truck_payload_new - dump_truck_payload_old:.0f}", f"{swings_to_fill_truck_new - swings_to_fill_truck_old:.1f}", 
+            f"{time_to_fill_truck_new - time_to_fill_truck_old:.1f}", f"{avg_trucks_per_hour_new - avg_trucks_per_hour_old:.1f}",
+            "-", f"{truck_tonnage_per_hour_new - truck_tonnage_per_hour_old:.0f}"
+        ],
+        '% Difference': [
+             f"{(dump_truck_payload_new - dump_truck_payload_old) / dump_truck_payload_old * 100:.0f}%", 
+            f"{(swings_to_fill_truck_new - swings_to_fill_truck_old) / swings_to_fill_truck_old * 100:.0f}%",
+            f"{(time_to_fill_truck_new - time_to_fill_truck_old) / time_to_fill_truck_old * 100:.0f}%",
+            f"{(avg_trucks_per_hour_new - avg_trucks_per_hour_old) / avg_trucks_per_hour_old * 100:.0f}%",
+            "-",
+            f"{(truck_tonnage_per_hour_new - truck_tonnage_per_hour_old) / truck_tonnage_per_hour_old * 100:.0f}%"
+        ]
+    }
+    
+    # 1000 Swings Side-by-Side Simulation Data
+    swings_simulation_data = {
+        '                Description                ': [
+             'Number of Swings', 'Total Volume (m³)', 
+            'Total Tonnes', 'Total Trucks'
+        ],
+        'Old Bucket': [
+            '1000', f"{total_m3_per_day_old:.0f}", f"{total_tonnage_per_day_old:.0f}", 
+            f"{total_trucks_per_day_old:.0f}"
+        ],
+        'XMOR® Bucket': [
+            '1000', f"{total_m3_per_day_new:.0f}", f"{total_tonnage_per_day_new:.0f}", 
+            f"{total_trucks_per_day_new:.0f}"
+        ],
+        'Difference': [
+            '-', f"{total_m3_per_day_new - total_m3_per_day_old:.0f}", 
+            f"{total_tonnage_per_day_new - total_tonnage_per_day_old:.0f}", 
+            f"{total_trucks_per_day_new - total_trucks_per_day_old:.0f}"
+        ],
+        '% Difference': [
+            '-', f"{(total_m3_per_day_new - total_m3_per_day_old) / total_m3_per_day_old * 100:.0f}%", 
+            f"{(total_tonnage_per_day_new - total_tonnage_per_day_old) / total_tonnage_per_day_old * 100:.0f}%", 
+            f"{(total_trucks_per_day_new - total_trucks_per_day_old) / total_trucks_per_day_old * 100:.0f}%"
+        ]
+    }
+    
+    # 10% Improved Cycle Time Simulation Data
+    improved_cycle_data = {
+        '                Description                ': [
+             'Number of Swings', 'Total Volume (m³)', 
+            'Total Tonnes', 'Total Trucks'
+        ],
+        'Old Bucket': [
+            '1000', f"{total_m3_per_day_old:.0f}", f"{total_tonnage_per_day_old:.0f}", 
+            f"{total_trucks_per_day_old:.0f}"
+        ],
+        'XMOR® Bucket': [
+            '1100', f"{1.1 * total_m3_per_day_new:.0f}", f"{1.1 * total_tonnage_per_day_new:.0f}", 
+            f"{1.1 * total_trucks_per_day_new:.0f}"
+        ],
+        'Difference': [
+            '100', f"{1.1 * total_m3_per_day_new - total_m3_per_day_old:.0f}", 
+            f"{1.1 * total_tonnage_per_day_new - total_tonnage_per_day_old:.0f}", 
+            f"{1.1 * total_trucks_per_day_new - total_trucks_per_day_old:.0f}"
+        ],
+        '% Difference': [
+            '10%', f"{(1.1 * total_m3_per_day_new - total_m3_per_day_old) / total_m3_per_day_old * 100:.0f}%", 
+            f"{(1.1 * total_tonnage_per_day_new - total_tonnage_per_day_old) / total_tonnage_per_day_old * 100:.0f}%", 
+            f"{(1.1 * total_trucks_per_day_new - total_trucks_per_day_old) / total_trucks_per_day_old * 100:.0f}%"
+        ]
+    }
+
+    return side_by_side_data, loadout_productivity_data, swings_simulation_data, improved_cycle_data
+
+def notes_text(user_data, optimal_bucket, swl, comparison, truck_brand, truck_model):
+    """Notes paragraph markup (ReportLab mini-HTML) for the end of the report."""
+    dump_truck_payload = comparison['dump_truck_payload']
+    dump_truck_payload_old, dump_truck_payload_new = comparison['dump_truck_payload_old'], comparison['dump_truck_payload_new']
+
+    paragraph_text = ""
+
+    # Optional notes about dump truck fill factor
+    if dump_truck_payload_new != dump_truck_payload:
+        paragraph_text += f"*Dump Truck fill factor of {(100 * dump_truck_payload_new / dump_truck_payload):.1f}% applied for XMOR® Bucket pass matching.<br/><br/>"
+    if dump_truck_payload_old != dump_truck_payload:
+        paragraph_text += f"*Dump Truck fill factor of {(100 * dump_truck_payload_old / dump_truck_payload):.1f}% applied for Old Bucket pass matching.<br/><br/>"
+    
+    # Continue with the rest of the paragraph text
+    paragraph_text += (
+        f"Total Suspended Load (XMOR® Bucket): {optimal_bucket['total_bucket_weight']:.0f}kg<br/><br/>"
+        f"Safe Working Load at {user_data['reach']}m reach ({user_data['make']} {user_data['model']}): {swl:.0f}kg<br/><br/>"
+        f"Calculations based on the {user_data['make']} {user_data['model']} with a {user_data['boom_length']}m boom, "
+        f"{user_data['arm_length']}m arm, {user_data['cwt']}kg counterweight, {user_data['shoe_width']}mm shoes, "
+        f"operating at a reach of {user_data['reach']}m, and with a material density of {user_data['material_density']:.0f}kg/m³.<br/><br/>"
+        f"Dump Truck: {truck_brand} {truck_model}, Rated payload = {user_data['dump_truck_payload'] * 1000:.0f}kg"
+    )
+    if dump_truck_payload < user_data['dump_truck_payload'] * 1000:
+        paragraph_text += (
+            f", limited to {dump_truck_payload:.0f}kg by its {user_data['dump_truck_heaped']:g}m³ heaped body "
+            f"at this material density"
+        )
+
+    return paragraph_text
@@ -0,0 +1,280 @@
+"""Append-only JSONL log of bucket calculations and email leads.
+
+Every record is one JSON object per line:
+
+    {"ts": 1729300000.1, "event": "calculation", "inputs": {...}, "outputs": {...}}
+
+Records are buffered in memory and written by a background thread, so the
+Streamlit script only pays for a json.dumps and a list append. The active
+file is rotated into numbered segments once it grows past ``max_bytes`` and
+``compact()`` folds all rotated segments into a single file where identical
+calculations are collapsed into one record with a ``count``. Several
+processes (API or Streamlit workers) can share one log directory: appends
+are single O_APPEND writes under a shared flock on ``<name>.lock`` and
+rotation and compaction hold it exclusively, so a segment is never
+compacted away while another process is still appending to it.
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one writer process per directory
+    fcntl = None
+
+DEFAULT_LOG_DIR = os.environ.get('BUCKET_LOG_DIR', 'logs')
+DEFAULT_LOG_NAME = 'calculations'
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_MAX_BUFFERED = 256
+
+
+def json_default(value):
+    """Serialise numpy/pandas scalars that json doesn't know about."""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def dumps_record(record):
+    """Serialise a record the same way the log writes it (compact, key-sorted)."""
+    return json.dumps(record, default=json_default, separators=(',', ':'), sort_keys=True, ensure_ascii=False)
+
+
+class RequestLog:
+    """Buffered, rotating, append-only JSONL log."""
+
+    def __init__(self, log_dir=DEFAULT_LOG_DIR, name=DEFAULT_LOG_NAME, max_bytes=DEFAULT_MAX_BYTES,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_buffered=DEFAULT_MAX_BUFFERED, background=True):
+        self.log_dir = log_dir
+        self.name = name
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._segment_re = re.compile(re.escape(name) + r'\.(\d+)\.jsonl$')
+
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._flush_loop, name=f'{name}-log-flush', daemon=True)
+            self._thread.start()
+        atexit.register(self.close)
+
+    # Paths
+    @property
+    def active_path(self):
+        return os.path.join(self.log_dir, f'{self.name}.jsonl')
+
+    @property
+    def lock_path(self):
+        return os.path.join(self.log_dir, f'{self.name}.lock')
+
+    @property
+    def compacted_path(self):
+        return os.path.join(self.log_dir, f'{self.name}.compacted.jsonl')
+
+    def segment_paths(self):
+        """Rotated segments, oldest first."""
+        segments = []
+        for filename in os.listdir(self.log_dir):
+            match = self._segment_re.fullmatch(filename)
+            if match:
+                segments.append((int(match.group(1)), os.path.join(self.log_dir, filename)))
+        return [path for _, path in sorted(segments)]
+
+    def all_paths(self):
+        """Every file that holds records, in replay order."""
+        paths = []
+        if os.path.exists(self.compacted_path):
+            paths.append(self.compacted_path)
+        paths.extend(self.segment_paths())
+        if os.path.exists(self.active_path):
+            paths.append(self.active_path)
+        return paths
+
+    # Writing
+    def append(self, event, **fields):
+        """Queue a record for writing. Never touches the disk on the caller's thread."""
+        if self._closed:
+            return
+        record = {'ts': time.time(), 'event': event}
+        record.update(fields)
+        line = dumps_record(record) + '\n'
+        with self._buffer_lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.max_buffered
+        if full:
+            if self._thread is None:
+                self.flush()
+            else:
+                self._wake.set()
+
+    def log_calculation(self, inputs, outputs):
+        self.append('calculation', inputs=inputs, outputs=outputs)
+
+    def log_email(self, email, inputs=None, outputs=None):
+        self.append('email', email=email, inputs=inputs, outputs=outputs)
+
+    def flush(self):
+        """Write everything buffered so far and rotate if the active file is full."""
+        with self._buffer_lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        data = ''.join(lines).encode('utf-8')
+        # Shared lock: appends from several processes run together, but never while
+        # another process rotates or compacts the file this fd points at
+        with self._directory_lock(shared=True):
+            # Unbuffered, so the batch is one O_APPEND write and can't interleave with other processes
+            with open(self.active_path, 'ab', buffering=0) as f:
+                f.write(data)
+                size = f.tell()
+        if size >= self.max_bytes:
+            with self._directory_lock():
+                self._rotate(min_bytes=self.max_bytes)
+
+    @contextlib.contextmanager
+    def _directory_lock(self, shared=False):
+        """flock ``<name>.lock``: shared around appends, exclusive around rotation and compaction."""
+        with self._write_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rotate(self, min_bytes=1):
+        """Move the active file to the next segment number; call with the exclusive _directory_lock held.
+
+        The size is checked again here since another process may have
+        rotated the file between our write and taking the lock.
+        """
+        try:
+            if os.path.getsize(self.active_path) < min_bytes:
+                return
+        except FileNotFoundError:
+            return
+        segments = self.segment_paths()
+        next_seq = 1
+        if segments:
+            next_seq = int(self._segment_re.search(segments[-1]).group(1)) + 1
+        os.replace(self.active_path, os.path.join(self.log_dir, f'{self.name}.{next_seq:06d}.jsonl'))
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Failed to flush request log: {e}")
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    # Reading
+    def scan(self, events=None, include_active=True):
+        """Yield records from every file in replay order.
+
+        ``events`` restricts the output to the given event names; lines of
+        other events are skipped with a substring check before json parsing.
+        Partially written lines (e.g. after a crash) are ignored.
+        """
+        self.flush()
+        paths = self.all_paths()
+        if not include_active and paths and paths[-1] == self.active_path:
+            paths = paths[:-1]
+        yield from scan_files(paths, events)
+
+    # Compaction
+    def compact(self):
+        """Fold the compacted file and all rotated segments into one compacted file.
+
+        Calculation records with identical inputs are merged into a single record
+        carrying ``count``, ``first_ts`` and the latest ``ts``/``outputs``. Other
+        events are kept as they are. Records are written in ``ts`` order, as
+        warm-up and replay expect. The active file is rotated first so that
+        everything flushed so far gets compacted. Returns the number of records
+        written.
+        """
+        self.flush()
+        with self._directory_lock():
+            self._rotate()
+            sources = []
+            if os.path.exists(self.compacted_path):
+                sources.append(self.compacted_path)
+            segments = self.segment_paths()
+            sources.extend(segments)
+            if not sources:
+                return 0
+
+            merged = {}
+            other = []
+            for record in scan_files(sources):
+                if record.get('event') != 'calculation':
+                    other.append(record)
+                    continue
+                key = dumps_record(record.get('inputs'))
+                count = record.get('count', 1)
+                existing = merged.get(key)
+                if existing is None:
+                    record['count'] = count
+                    record.setdefault('first_ts', record.get('ts'))
+                    merged[key] = record
+                else:
+                    existing['count'] += count
+                    existing['ts'] = record.get('ts')
+                    existing['outputs'] = record.get('outputs')
+
+            records = sorted(other + list(merged.values()), key=lambda record: record.get('ts') or 0)
+            tmp_path = self.compacted_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(dumps_record(record) + '\n')
+            os.replace(tmp_path, self.compacted_path)
+            for path in segments:
+                os.remove(path)
+        return len(records)
+
+
+def scan_files(paths, events=None):
+    """Yield json records from a list of JSONL files, skipping unreadable lines."""
+    needles = None
+    if events is not None:
+        needles = [f'"event":{json.dumps(event)}'.encode('utf-8') for event in events]
+    for path in paths:
+        try:
+            f = open(path, 'rb', buffering=1024 * 1024)
+        except FileNotFoundError:
+            continue  # Rotated or compacted away while we were scanning
+        with f:
+            for line in f:
+                if needles is not None and not any(needle in line for needle in needles):
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
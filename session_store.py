@@ -0,0 +1,151 @@
+"""Per-session calculation state for the Streamlit app, bounded in count and idle time.
+
+Streamlit keeps a tab's ``st.session_state`` for as long as the tab is
+open, idle or not. The app therefore keeps only small flags there plus a
+session key; each session's calculation graph (inputs, comparison numbers,
+notes text) lives in one process-wide ``SessionStore``. Sessions idle for
+longer than BUCKET_SESSION_TTL seconds are dropped, and beyond
+BUCKET_SESSION_MAX sessions the least recently used ones go first. A tab
+that comes back after eviction simply rebuilds its graph from its widget
+values on the next rerun.
+
+Dropping a graph also releases the catalogue engine it references, so
+old catalogue versions don't stay in memory after a hot reload because
+some tab was left open. ``report()`` gives the number of sessions, their
+approximate memory and eviction counts; a summary is printed at most
+every BUCKET_SESSION_REPORT_INTERVAL seconds.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+SESSION_TTL = float(os.environ.get('BUCKET_SESSION_TTL', 1800))
+SESSION_MAX = int(os.environ.get('BUCKET_SESSION_MAX', 500))
+REPORT_INTERVAL = float(os.environ.get('BUCKET_SESSION_REPORT_INTERVAL', 300))
+
+
+def approx_size(value, seen=None):
+    """Rough deep size in bytes of plain Python, numpy and pandas values."""
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k, seen) + approx_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, seen) for item in value)
+    return size
+
+
+class SessionEntry:
+    def __init__(self, state, now):
+        self.state = state
+        self.created = now
+        self.last_seen = now
+
+
+class SessionStore:
+    """Session key -> state made by ``factory``, evicted by idle time and LRU.
+
+    The state's ``values()`` dict is what the memory report measures;
+    values of ``shared_types`` (the catalogue engine) are left out since
+    every session references the same one.
+    """
+
+    def __init__(self, factory, max_sessions=SESSION_MAX, ttl=SESSION_TTL, report_interval=REPORT_INTERVAL,
+                 shared_types=()):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.report_interval = report_interval
+        self.shared_types = tuple(shared_types)
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        self._sessions = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+        self._last_report = time.monotonic()
+
+    def get(self, key):
+        """The session's state, created if it is new or was evicted."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = SessionEntry(self.factory(), now)
+                self._sessions[key] = entry
+                self.created += 1
+            else:
+                entry.last_seen = now
+                self._sessions.move_to_end(key)
+            self._evict(now, keep=key)
+            report_due = self.report_interval and now - self._last_report >= self.report_interval
+            if report_due:
+                self._last_report = now
+        if report_due:
+            print(self.format_report())
+        return entry.state
+
+    def discard(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def _evict(self, now, keep=None):
+        while self._sessions:
+            key, entry = next(iter(self._sessions.items()))
+            if key == keep:
+                break  # Only the current session is left
+            if self.ttl and now - entry.last_seen > self.ttl:
+                self.evicted_idle += 1
+            elif len(self._sessions) > self.max_sessions:
+                self.evicted_lru += 1
+            else:
+                break
+            del self._sessions[key]
+
+    def evict_idle(self):
+        """Drop every session idle for longer than the TTL; returns how many are left."""
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._sessions)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def report(self):
+        """Sessions held, their approximate memory and eviction counts."""
+        # Snapshot under the lock (get and eviction change the entries from other script threads);
+        # the sizing, which walks every value, runs after it is released
+        with self._lock:
+            now = time.monotonic()
+            snapshots = [(entry.last_seen, entry.state.values()) for entry in self._sessions.values()]
+            counts = {'created': self.created, 'evicted_idle': self.evicted_idle, 'evicted_lru': self.evicted_lru}
+        sizes = []
+        for _, values in snapshots:
+            values = {key: value for key, value in values.items() if not isinstance(value, self.shared_types)}
+            sizes.append(approx_size(values))
+        return {
+            'sessions': len(snapshots),
+            'bytes': sum(sizes),
+            'max_session_bytes': max(sizes, default=0),
+            'oldest_idle_s': max((now - last_seen for last_seen, _ in snapshots), default=0.0),
+            **counts,
+        }
+
+    def format_report(self):
+        report = self.report()
+        return (f"Sessions: {report['sessions']} held, {report['bytes'] / 1024:.0f} KiB "
+                f"(largest {report['max_session_bytes'] / 1024:.1f} KiB), {report['created']} created, "
+                f"evicted {report['evicted_idle']} idle / {report['evicted_lru']} LRU")
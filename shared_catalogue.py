@@ -0,0 +1,250 @@
+"""Catalogues published once to disk and memory-mapped by every worker.
+
+``publish_catalogue`` parses the four CSVs, builds the lookup indexes and
+writes everything as .npy arrays plus a manifest into a new version
+directory, then points ``<root>/CURRENT`` at it. ``attach_catalogue``
+memory-maps those arrays read-only, so every worker process shares the
+same page-cache pages: numeric columns and indexes are used in place and
+text columns become categoricals whose codes live in the mapping. Only the
+distinct strings are held per process, so per-worker memory stays about
+the same as the catalogue grows and attaching is almost instant.
+
+Enable it for the app and the API by setting BUCKET_SHARED_CATALOGUE to a
+directory; each worker publishes its CSVs on start (reusing the version
+already there when the contents are the same) and attaches. Publish ahead
+of time with:
+
+    python shared_catalogue.py publish /dev/shm/bucket-catalogue
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from bucket_engine import BucketEngine, SWL_KEY_COLUMNS, load_catalogues, read_sources, validate_catalogues
+
+SHARED_CATALOGUE_DIR = os.environ.get('BUCKET_SHARED_CATALOGUE')
+FRAMES = ['swl', 'bucket', 'bhc_bucket', 'dump_truck']
+FORMAT_VERSION = 2  # 2: truck body volumes stored as numbers
+
+
+def _code_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _write_frame(directory, name, df):
+    """Write each column as an .npy file; return the frame's manifest entry."""
+    columns = []
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        filename = f'{name}.{i}.npy'
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            np.save(os.path.join(directory, filename), values.to_numpy())
+            columns.append({'name': column, 'kind': 'numeric', 'file': filename})
+        else:
+            codes, categories = pd.factorize(values, use_na_sentinel=True)
+            np.save(os.path.join(directory, filename), codes.astype(_code_dtype(len(categories))))
+            columns.append({'name': column, 'kind': 'category', 'file': filename,
+                            'categories': [str(category) for category in categories]})
+    return {'rows': len(df), 'columns': columns}
+
+
+def _swl_indexes(swl_data):
+    """Per-model row ranges (rows sorted by model, original order kept) and first class per model."""
+    model_codes, models = pd.factorize(swl_data['model'], use_na_sentinel=True)
+    order = np.argsort(model_codes, kind='stable')
+    sorted_codes = model_codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(len(models)), side='left')
+    ends = np.searchsorted(sorted_codes, np.arange(len(models)), side='right')
+    first_rows = order[starts]
+    model_class = swl_data['class'].to_numpy(dtype=float)[first_rows]
+    return {
+        'swl_models': [str(model) for model in models],
+        'arrays': {
+            'swl_order': order.astype(np.int64),
+            'swl_model_start': starts.astype(np.int64),
+            'swl_model_end': ends.astype(np.int64),
+            'swl_model_class': model_class,
+        },
+    }
+
+
+def _published(root, digest):
+    """Versions under ``root`` built from these CSV contents in the current format."""
+    versions = []
+    for name in os.listdir(root):
+        if not name.endswith(digest[:16]):
+            continue
+        try:
+            with open(os.path.join(root, name, 'manifest.json'), encoding='utf-8') as f:
+                if json.load(f).get('format') == FORMAT_VERSION:
+                    versions.append(name)
+        except (OSError, ValueError):
+            continue
+    return sorted(versions)
+
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, 'CURRENT'), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_catalogue(root, swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv, keep=3):
+    """Parse the CSVs, build indexes and publish them as the current version.
+
+    Publishing the same CSV contents again reuses the existing version
+    (unless it was written in an older format).
+    Catalogues missing columns the calculation needs raise ValueError.
+    Older versions beyond ``keep`` are removed (workers that still have
+    them mapped keep working; the files go away once they detach).
+    Returns the version name.
+    """
+    sources = [swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv]
+    digest, contents = read_sources(sources)
+    os.makedirs(root, exist_ok=True)
+
+    existing = _published(root, digest)
+    if existing:
+        version = sorted(existing)[-1]
+    else:
+        catalogues = load_catalogues(contents)
+        validate_catalogues(*catalogues)  # Never point CURRENT at a catalogue workers can't use
+        frames = dict(zip(FRAMES, catalogues))
+        version = f'{time.strftime("%Y%m%d%H%M%S")}-{digest[:16]}'
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=root)
+        manifest = {
+            'format': FORMAT_VERSION,
+            'version': version,
+            'created': time.time(),
+            'sources': [os.path.abspath(path) for path in sources],
+            'frames': {name: _write_frame(staging, name, df) for name, df in frames.items()},
+        }
+        indexes = _swl_indexes(frames['swl'])
+        for name, array in indexes['arrays'].items():
+            np.save(os.path.join(staging, f'{name}.npy'), array)
+        manifest['indexes'] = {'swl_models': indexes['swl_models'], 'arrays': sorted(indexes['arrays'])}
+        with open(os.path.join(staging, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        try:
+            os.replace(staging, os.path.join(root, version))
+        except OSError:
+            # Another worker published the same contents first
+            shutil.rmtree(staging, ignore_errors=True)
+            existing = _published(root, digest)
+            if not existing:
+                raise
+            version = sorted(existing)[-1]
+
+    # Atomically point CURRENT at the version
+    fd, tmp_path = tempfile.mkstemp(prefix='.CURRENT-', dir=root)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(root, 'CURRENT'))
+
+    versions = sorted(name for name in os.listdir(root) if not name.startswith('.') and name != 'CURRENT')
+    for old in versions[:-keep] if keep else []:
+        if old != version:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+
+class SharedCatalogue:
+    """Read-only view of one published catalogue version."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self.frames = {name: self._frame(entry) for name, entry in self.manifest['frames'].items()}
+        self.arrays = {name: self._load(f'{name}.npy') for name in self.manifest['indexes']['arrays']}
+        self.swl_model_codes = {model: code for code, model in enumerate(self.manifest['indexes']['swl_models'])}
+
+    def _load(self, filename):
+        return np.load(os.path.join(self.directory, filename), mmap_mode='r')
+
+    def _frame(self, entry):
+        data = {}
+        for column in entry['columns']:
+            values = self._load(column['file'])
+            if column['kind'] == 'category':
+                values = pd.Categorical.from_codes(values, categories=column['categories'], validate=False)
+            data[column['name']] = values
+        return pd.DataFrame(data, copy=False)
+
+
+def attach_catalogue(root):
+    """Attach the CURRENT version under ``root``."""
+    version = current_version(root)
+    if version is None:
+        raise FileNotFoundError(f'no catalogue published under {root}')
+    return SharedCatalogue(os.path.join(root, version))
+
+
+class SharedBucketEngine(BucketEngine):
+    """BucketEngine whose catalogues and indexes live in a shared catalogue.
+
+    The SWL lookup narrows to the model's row range from the published
+    index and compares the remaining key columns there, keeping the first
+    match in catalogue order as find_matching_swl does.
+    """
+
+    def __init__(self, catalogue, cache_size=4096):
+        self.catalogue = catalogue
+        frames = catalogue.frames
+        super().__init__(frames['swl'], frames['bucket'], frames['bhc_bucket'], frames['dump_truck'],
+                         cache_size=cache_size, version=catalogue.version)
+
+    def _build_indexes(self):
+        swl_data = self.swl_data
+        self._swl_make = swl_data['make'].array
+        self._swl_keys = {column: swl_data[column].to_numpy() for column in SWL_KEY_COLUMNS[2:]}
+        self._swl_values = swl_data['swl'].to_numpy()
+
+    def find_matching_swl(self, user_data):
+        code = self.catalogue.swl_model_codes.get(user_data['model'])
+        if code is None:
+            return None
+        arrays = self.catalogue.arrays
+        rows = arrays['swl_order'][arrays['swl_model_start'][code]:arrays['swl_model_end'][code]]
+        match = np.asarray(self._swl_make[rows] == user_data['make'])
+        for column, field in zip(SWL_KEY_COLUMNS[2:], ['cwt', 'shoe_width', 'reach', 'boom_length', 'arm_length']):
+            match &= self._swl_keys[column][rows] == user_data[field]
+        hits = np.flatnonzero(match)
+        if not len(hits):
+            return None
+        return self._swl_values[rows[hits[0]]]
+
+    def excavator_class(self, model):
+        return self.catalogue.arrays['swl_model_class'][self.catalogue.swl_model_codes[model]]
+
+
+def engine_from_env(swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv):
+    """SharedBucketEngine if BUCKET_SHARED_CATALOGUE is set, else a private BucketEngine.
+
+    With a shared catalogue the CSVs are published first; unchanged contents
+    reuse the existing version, so that only costs reading and hashing them.
+    """
+    if not SHARED_CATALOGUE_DIR:
+        return BucketEngine.from_csv(swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv)
+    publish_catalogue(SHARED_CATALOGUE_DIR, swl_csv, bucket_csv, bhc_bucket_csv, dump_truck_csv)
+    return SharedBucketEngine(attach_catalogue(SHARED_CATALOGUE_DIR))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (3, 7) or sys.argv[1] != 'publish':
+        sys.exit("usage: python shared_catalogue.py publish ROOT [SWL_CSV BUCKET_CSV BHC_BUCKET_CSV DUMP_TRUCK_CSV]")
+    csvs = sys.argv[3:] or ['excavator_swl.csv', 'bucket_data.csv', 'bhc_bucket_data.csv', 'dump_trucks.csv']
+    print(f"Published {publish_catalogue(sys.argv[2], *csvs)} to {sys.argv[2]}")
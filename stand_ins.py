@@ -0,0 +1,155 @@
+"""Local stand-ins for the SendGrid and HubSpot APIs.
+
+Answers ``POST /v3/mail/send`` (202) and ``POST /crm/v3/objects/contacts``
+(201) after a configurable latency, failing a configurable fraction of
+requests, so the delivery path can be load tested without touching the
+real services. Run it on its own and point the app at it with:
+
+    python stand_ins.py --port 8025 --sendgrid-latency 0.8 --error-rate 0.05
+    SENDGRID_API_HOST=http://127.0.0.1:8025 HUBSPOT_API_HOST=http://127.0.0.1:8025 streamlit run BucketEmail.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROUTES = {
+    '/v3/mail/send': ('sendgrid', 202),
+    '/crm/v3/objects/contacts': ('hubspot', 201),
+}
+
+
+def service_config(latency=0.0, jitter=0.0, error_rate=0.0, error_status=500):
+    """Behaviour of one stand-in service: latency (s) +/- jitter and an error fraction."""
+    return {'latency': latency, 'jitter': jitter, 'error_rate': error_rate, 'error_status': error_status}
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+
+        route = ROUTES.get(self.path.split('?')[0])
+        if route is None:
+            self._respond(404, {'errors': [{'message': 'not found'}]})
+            return
+        service, ok_status = route
+        config = self.server.configs[service]
+
+        delay = config['latency']
+        if config['jitter']:
+            delay += random.uniform(-config['jitter'], config['jitter'])
+        if delay > 0:
+            time.sleep(delay)
+
+        if random.random() < config['error_rate']:
+            status, body = config['error_status'], {'errors': [{'message': 'injected failure'}]}
+        else:
+            status, body = ok_status, ({'id': str(random.getrandbits(48))} if service == 'hubspot' else None)
+        self.server.record(service, status)
+        self._respond(status, body)
+
+    def _respond(self, status, body):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StandInServer:
+    """SendGrid + HubSpot stand-in running on a background thread."""
+
+    def __init__(self, sendgrid=None, hubspot=None, host='127.0.0.1', port=0):
+        self._server = _Server((host, port), _StandInHandler)
+        self._server.configs = {
+            'sendgrid': sendgrid or service_config(),
+            'hubspot': hubspot or service_config(),
+        }
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+        self._server.record = self._record
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _record(self, service, status):
+        with self._stats_lock:
+            self._stats[(service, status)] += 1
+
+    def stats(self):
+        """Responses sent so far as {service: {status: count}}."""
+        with self._stats_lock:
+            items = list(self._stats.items())
+        stats = {}
+        for (service, status), count in items:
+            stats.setdefault(service, {})[status] = count
+        return stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stand-ins', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+def add_service_arguments(parser):
+    """Latency/error options shared by this script and loadtest.py."""
+    parser.add_argument('--sendgrid-latency', type=float, default=0.3, help='seconds per SendGrid request')
+    parser.add_argument('--hubspot-latency', type=float, default=0.2, help='seconds per HubSpot request')
+    parser.add_argument('--jitter', type=float, default=0.05, help='+/- seconds added to every latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    parser.add_argument('--sendgrid-error-rate', type=float, help='overrides --error-rate for SendGrid')
+    parser.add_argument('--hubspot-error-rate', type=float, help='overrides --error-rate for HubSpot')
+
+
+def configs_from_args(args):
+    def rate(value):
+        return args.error_rate if value is None else value
+    return (
+        service_config(args.sendgrid_latency, args.jitter, rate(args.sendgrid_error_rate)),
+        service_config(args.hubspot_latency, args.jitter, rate(args.hubspot_error_rate)),
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local SendGrid/HubSpot stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    add_service_arguments(parser)
+    args = parser.parse_args()
+    sendgrid_config, hubspot_config = configs_from_args(args)
+    server = StandInServer(sendgrid_config, hubspot_config, args.host, args.port)
+    print(f"SendGrid/HubSpot stand-in listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats(), indent=2))
@@ -0,0 +1,194 @@
+"""Lightweight per-stage latency tracing.
+
+Wrap a stage in ``with span('generate_pdf'):`` or decorate it with
+``@traced('generate_pdf')``. Each finished span records its duration in a
+per-stage window used for p50/p95/p99, and, when an export file is set,
+is written as an OpenTelemetry-style span record (trace/span ids, parent,
+start/end in unix nanoseconds, attributes) through a buffered RequestLog.
+
+Tracing is off unless BUCKET_TRACING=1. When off, ``span`` hands back a
+shared no-op context manager and ``traced`` returns the function itself,
+so the instrumented code pays close to nothing.
+
+Summarise an exported file with:
+
+    python tracing.py logs/spans.jsonl
+"""
+
+import contextvars
+import functools
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import deque
+
+from request_log import RequestLog, scan_files
+
+DEFAULT_WINDOW = 10000
+PERCENTILES = (50, 95, 99)
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))  # ceil without floats
+    return sorted_values[int(rank) - 1]
+
+
+def summarise(durations_by_stage):
+    """Count, mean and p50/p95/p99 (milliseconds) for each stage."""
+    summary = {}
+    for stage, durations in durations_by_stage.items():
+        values = sorted(durations)
+        if not values:
+            continue
+        stats = {'count': len(values), 'mean_ms': sum(values) / len(values) * 1000}
+        for pct in PERCENTILES:
+            stats[f'p{pct}_ms'] = percentile(values, pct) * 1000
+        summary[stage] = stats
+    return summary
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.parent_span_id = parent.span_id if parent else None
+        self.span_id = secrets.token_hex(8)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        self.tracer.record(self, duration)
+        return False
+
+
+class Tracer:
+    """Collects span durations per stage and optionally exports them."""
+
+    def __init__(self, enabled=False, export_path=None, window=DEFAULT_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._durations = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+        if enabled and export_path:
+            log_dir, filename = os.path.split(export_path)
+            self._exporter = RequestLog(log_dir or '.', name=os.path.splitext(filename)[0])
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.environ.get('BUCKET_TRACING', '') not in ('', '0', 'false'),
+            export_path=os.environ.get('BUCKET_TRACE_FILE') or None,
+        )
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def traced(self, name=None):
+        """Decorator that runs the function inside a span named after the stage."""
+        def decorator(func):
+            if not self.enabled:
+                return func
+            stage = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with Span(self, stage, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, span, duration):
+        with self._lock:
+            durations = self._durations.get(span.name)
+            if durations is None:
+                durations = self._durations[span.name] = deque(maxlen=self.window)
+            durations.append(duration)
+        if self._exporter is not None:
+            self._exporter.append(
+                'span',
+                name=span.name,
+                traceId=span.trace_id,
+                spanId=span.span_id,
+                parentSpanId=span.parent_span_id,
+                startTimeUnixNano=span.start_ns,
+                endTimeUnixNano=span.start_ns + int(duration * 1e9),
+                attributes=span.attributes,
+            )
+
+    def summary(self):
+        """p50/p95/p99 per stage over the most recent ``window`` spans."""
+        with self._lock:
+            snapshot = {stage: list(durations) for stage, durations in self._durations.items()}
+        return summarise(snapshot)
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+
+
+tracer = Tracer.from_env()
+span = tracer.span
+traced = tracer.traced
+
+
+def summarise_export(paths):
+    """Per-stage percentiles from one or more exported span files."""
+    durations = {}
+    for record in scan_files(paths, events=['span']):
+        duration = (record['endTimeUnixNano'] - record['startTimeUnixNano']) / 1e9
+        durations.setdefault(record['name'], []).append(duration)
+    return summarise(durations)
+
+
+def format_summary(summary):
+    lines = [f"{'stage':<28}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)"]
+    for stage, stats in sorted(summary.items()):
+        lines.append(
+            f"{stage:<28}{stats['count']:>8}{stats['mean_ms']:>10.2f}"
+            f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+        )
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit("usage: python tracing.py SPANS.jsonl [MORE.jsonl ...]")
+    print(format_summary(summarise_export(sys.argv[1:])))
@@ -0,0 +1,71 @@
+"""Parsing and validation of calculation requests, shared by the API and the batch CLI.
+
+Bodies use the app's user_data field names. Missing, non-numeric,
+non-finite or out-of-range values raise BadRequest, which the API turns
+into a 400 and the batch CLI into an ``invalid`` result.
+"""
+
+import math
+
+SWL_FIELDS = ['make', 'model', 'cwt', 'shoe_width', 'reach', 'boom_length', 'arm_length']
+BUCKET_FIELDS = SWL_FIELDS + ['material_density', 'quick_hitch_weight']
+COMPARISON_FIELDS = BUCKET_FIELDS + ['current_bucket_size', 'current_bucket_weight',
+                                     'dump_truck_payload', 'machine_swings_per_minute']
+TEXT_FIELDS = {'make', 'model'}
+OPTIONAL_FIELDS = ['dump_truck_heaped']
+POSITIVE_FIELDS = {'material_density', 'current_bucket_size', 'dump_truck_payload', 'machine_swings_per_minute',
+                   'dump_truck_heaped'}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _parse_number(field, value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f'{field} must be a number')
+    if not math.isfinite(number):
+        raise BadRequest(f'{field} must be a finite number')
+    if field in POSITIVE_FIELDS and number <= 0:
+        raise BadRequest(f'{field} must be greater than zero')
+    return number
+
+
+def parse_user_data(body, fields):
+    """Pull the required fields out of a request body, numbers as floats."""
+    if not isinstance(body, dict):
+        raise BadRequest('request body must be a JSON object')
+    missing = [field for field in fields if field not in body]
+    if missing:
+        raise BadRequest(f"missing fields: {', '.join(missing)}")
+    user_data = {}
+    for field in fields:
+        if field in TEXT_FIELDS:
+            user_data[field] = str(body[field])
+        else:
+            user_data[field] = _parse_number(field, body[field])
+    for field in OPTIONAL_FIELDS:
+        if body.get(field) is not None:
+            user_data[field] = _parse_number(field, body[field])
+    return user_data
+
+
+def parse_select_bhc(body):
+    """select_bhc as a bool: JSON true/false or the strings "true"/"false", absent means false."""
+    value = body.get('select_bhc')
+    if value is None:
+        return False
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false'):
+        return value.strip().lower() == 'true'
+    raise BadRequest('select_bhc must be true or false')
+
+
+def clean_value(value):
+    """NaN isn't valid JSON; report it as null."""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
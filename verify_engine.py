@@ -0,0 +1,520 @@
+"""Golden-output and property verification of the calculation engine.
+
+Every shipped excavator configuration (each row of the SWL chart) is run
+with every dump truck over a density grid, for both bucket catalogues,
+with the other inputs fixed (see FIXED_INPUTS). ``snapshot`` computes the
+outputs with the reference functions in bucket_engine (find_matching_swl,
+select_optimal_bucket, compute_comparison: the loops the app was built
+on) and saves them; ``check`` runs the fast paths over the same
+cross-product and compares them with the snapshot:
+
+    engine       BucketEngine.calculate (indexed SWL lookup, cached bucket selection)
+    vectorised   select_optimal_buckets + comparison_arrays (the sweep and API batch path)
+    shared       SharedBucketEngine on a freshly published shared catalogue
+    reference    the reference functions again (catches changes to the reference itself)
+
+Property checks run on every engine's outputs: the chosen bucket never
+exceeds the SWL, it is the largest bucket that fits, the truck load is
+its payload or heaped volume limit, pass matching stays within +10% and
+lands within 0.05 of a whole pass, and the bucket size never grows with
+material density.
+
+    python verify_engine.py snapshot
+    python verify_engine.py check
+    python verify_engine.py check --engines vectorised --rtol 1e-12
+
+Work is split over a process pool by configuration. The snapshot is
+written to golden/engine-<catalogue digest>.npz; without one, ``check``
+computes the reference outputs as it goes. Exit status is 1 on any
+mismatch or property violation.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bucket_engine import (
+    SWL_KEY_COLUMNS, SWL_KEY_FIELDS, TRUCK_HEAPED_COLUMN, BucketEngine, comparison_arrays, compute_comparison,
+    find_matching_swl, load_catalogues, read_sources, select_optimal_bucket
+)
+
+SWL_CSV = 'excavator_swl.csv'
+BUCKET_CSV = 'bucket_data.csv'
+BHC_BUCKET_CSV = 'bhc_bucket_data.csv'
+DUMP_TRUCK_CSV = 'dump_trucks.csv'
+GOLDEN_DIR = 'golden'
+
+DENSITIES = np.arange(1000.0, 2601.0, 100.0)
+FIXED_INPUTS = {
+    'current_bucket_size': 2.0,
+    'current_bucket_weight': 1500.0,
+    'quick_hitch_weight': 500.0,
+    'machine_swings_per_minute': 3.0,
+}
+COMPARISON_KEYS = list(comparison_arrays(1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0))
+ENGINES = ['engine', 'vectorised', 'shared', 'reference']
+MAX_EXAMPLES = 3
+CHUNK_CONFIGS = 50  # 50 x 2 x 17 bucket selections per chunk fit the engine's default cache of 4096
+
+# Per-process state, set up by _init_worker
+_state = None
+
+
+class Cases:
+    """Catalogues and the cross-product of configurations, catalogues, densities and trucks."""
+
+    def __init__(self, csvs):
+        self.digest, contents = read_sources(csvs)
+        self.swl_data, self.bucket_data, self.bhc_bucket_data, self.dump_truck_data = load_catalogues(contents)
+        self.catalogues = [self.bucket_data, self.bhc_bucket_data]
+
+        # Buckets of both catalogues numbered as one list: bucket_data rows, then bhc_bucket_data rows
+        self.bucket_offsets = [0, len(self.bucket_data)]
+        self.bucket_codes = [{}, {}]
+        for select_bhc, buckets in enumerate(self.catalogues):
+            for i, name in enumerate(buckets['bucket_name']):
+                self.bucket_codes[select_bhc].setdefault(name, self.bucket_offsets[select_bhc] + i)
+        self.bucket_sizes = np.concatenate([buckets['bucket_size'].to_numpy(dtype=float) for buckets in self.catalogues])
+        self.bucket_weights = np.concatenate([buckets['bucket_weight'].to_numpy(dtype=float) for buckets in self.catalogues])
+        self.bucket_classes = np.concatenate([buckets['class'].to_numpy(dtype=float) for buckets in self.catalogues])
+
+        self.configs = []
+        first_class = self.swl_data.groupby('model', sort=False)['class'].first()
+        for row in self.swl_data.to_dict('records'):
+            config = {field: row[column] for field, column in zip(SWL_KEY_FIELDS, SWL_KEY_COLUMNS)}
+            self.configs.append((config, float(first_class[row['model']])))
+        self.payloads = self.dump_truck_data['payload'].to_numpy(dtype=float)
+        self.heaped = self.dump_truck_data[TRUCK_HEAPED_COLUMN].to_numpy(dtype=float)
+
+    @property
+    def shape(self):
+        return len(self.configs), 2, len(DENSITIES), len(self.payloads)
+
+    def user_data(self, config, density, truck):
+        heaped = self.heaped[truck]
+        return {**config, **FIXED_INPUTS, 'material_density': float(density),
+                'dump_truck_payload': float(self.payloads[truck]),
+                'dump_truck_heaped': None if np.isnan(heaped) else float(heaped)}
+
+
+def empty_outputs(cases, n):
+    _, bhc, densities, trucks = cases.shape
+    outputs = {
+        'swl': np.full(n, np.nan),
+        'bucket': np.full((n, bhc, densities), -1, dtype=np.int16),
+        'total_bucket_weight': np.full((n, bhc, densities), np.nan),
+    }
+    outputs.update({key: np.full((n, bhc, densities, trucks), np.nan) for key in COMPARISON_KEYS})
+    return outputs
+
+
+# Engines
+def reference_outputs(cases, start, stop):
+    """Outputs of the reference functions, one call per distinct set of inputs."""
+    outputs = empty_outputs(cases, stop - start)
+    selections, comparisons = {}, {}
+    for i, (config, _) in enumerate(cases.configs[start:stop]):
+        swl = find_matching_swl(config, cases.swl_data)
+        if swl is None:
+            continue
+        outputs['swl'][i] = swl
+        if not swl:
+            continue
+        for select_bhc, buckets in enumerate(cases.catalogues):
+            for d, density in enumerate(DENSITIES):
+                key = (config['model'], swl, select_bhc, d)
+                if key not in selections:
+                    user_data = {**config, **FIXED_INPUTS, 'material_density': float(density)}
+                    selections[key] = select_optimal_bucket(user_data, buckets, swl, cases.swl_data)
+                optimal_bucket = selections[key]
+                if not optimal_bucket:
+                    continue
+                outputs['bucket'][i, select_bhc, d] = cases.bucket_codes[select_bhc][optimal_bucket['bucket_name']]
+                outputs['total_bucket_weight'][i, select_bhc, d] = optimal_bucket['total_bucket_weight']
+                for truck in range(len(cases.payloads)):
+                    key = (optimal_bucket['bucket_size'], optimal_bucket['total_bucket_weight'], d, truck)
+                    if key not in comparisons:
+                        comparisons[key] = compute_comparison(cases.user_data(config, density, truck), optimal_bucket)
+                    for name, value in comparisons[key].items():
+                        outputs[name][i, select_bhc, d, truck] = value
+    return outputs
+
+
+def engine_outputs(cases, start, stop, engine):
+    """Outputs of ``engine.calculate``, one call per case.
+
+    The engine's bucket cache is filled for the chunk by one batched
+    select_optimal_buckets call first; a cache miss would otherwise run the
+    reference loop, which ``reference`` already covers.
+    """
+    outputs = empty_outputs(cases, stop - start)
+    configs = cases.configs[start:stop]
+    requests = [({**config, **FIXED_INPUTS, 'material_density': float(density)}, select_bhc, swl)
+                for config, swl in ((config, engine.find_matching_swl(config)) for config, _ in configs) if swl
+                for select_bhc in (False, True) for density in DENSITIES]
+    if requests:
+        engine.select_optimal_buckets(*zip(*requests))
+    for i, (config, _) in enumerate(configs):
+        swl = engine.find_matching_swl(config)
+        if swl is not None:
+            outputs['swl'][i] = swl
+        for select_bhc in (0, 1):
+            for d, density in enumerate(DENSITIES):
+                for truck in range(len(cases.payloads)):
+                    result = engine.calculate(cases.user_data(config, density, truck), bool(select_bhc))
+                    if result is None:
+                        break  # No SWL or no bucket: the same for every truck
+                    optimal_bucket = result['optimal_bucket']
+                    outputs['bucket'][i, select_bhc, d] = cases.bucket_codes[select_bhc][optimal_bucket['bucket_name']]
+                    outputs['total_bucket_weight'][i, select_bhc, d] = optimal_bucket['total_bucket_weight']
+                    for name, value in result['comparison'].items():
+                        outputs[name][i, select_bhc, d, truck] = value
+    return outputs
+
+
+def vectorised_outputs(cases, start, stop, engine):
+    """Outputs of the batched bucket selection and comparison_arrays, a few array passes per chunk."""
+    outputs = empty_outputs(cases, stop - start)
+    configs = cases.configs[start:stop]
+    swls = [engine.find_matching_swl(config) for config, _ in configs]
+    outputs['swl'][:] = [np.nan if swl is None else swl for swl in swls]
+    requests = [(i, d) for i, swl in enumerate(swls) if swl for d in range(len(DENSITIES))]
+    if not requests:
+        return outputs
+    rows = np.array([i for i, _ in requests])
+    density_index = np.array([d for _, d in requests])
+    user_datas = [{**configs[i][0], **FIXED_INPUTS, 'material_density': float(DENSITIES[d])} for i, d in requests]
+    for select_bhc in (0, 1):
+        buckets = engine.select_optimal_buckets(user_datas, [bool(select_bhc)] * len(requests),
+                                                [swls[i] for i, _ in requests])
+        found = np.array([optimal_bucket is not None for optimal_bucket in buckets])
+        codes = np.array([cases.bucket_codes[select_bhc][b['bucket_name']] if b else -1 for b in buckets])
+        sizes = np.array([b['bucket_size'] if b else np.nan for b in buckets])
+        totals = np.array([b['total_bucket_weight'] if b else np.nan for b in buckets])
+        outputs['bucket'][rows, select_bhc, density_index] = codes
+        outputs['total_bucket_weight'][rows, select_bhc, density_index] = totals
+        if not found.any():
+            continue
+        comparison = comparison_arrays(
+            FIXED_INPUTS['current_bucket_size'], FIXED_INPUTS['current_bucket_weight'],
+            DENSITIES[density_index[found]][:, None], FIXED_INPUTS['quick_hitch_weight'], cases.payloads[None, :],
+            FIXED_INPUTS['machine_swings_per_minute'], sizes[found][:, None], totals[found][:, None],
+            cases.heaped[None, :])
+        for name, values in comparison.items():
+            outputs[name][rows[found], select_bhc, density_index[found]] = np.broadcast_to(
+                values, (found.sum(), len(cases.payloads)))
+    return outputs
+
+
+# Checks
+def _equal(actual, expected, rtol):
+    equal = (actual == expected) | (np.isnan(actual) & np.isnan(expected))
+    if rtol:
+        equal |= np.isclose(actual, expected, rtol=rtol, atol=0)
+    return equal
+
+
+def _case(cases, start, index):
+    """Describe one case of a chunk's output array by its index tuple."""
+    config, _ = cases.configs[start + index[0]]
+    described = {'config': {key: value.item() if hasattr(value, 'item') else value for key, value in config.items()}}
+    if len(index) > 1:
+        described['catalogue'] = 'bhc' if index[1] else 'bucket'
+    if len(index) > 2:
+        described['material_density'] = float(DENSITIES[index[2]])
+    if len(index) > 3:
+        described['truck'] = cases.dump_truck_data.iloc[index[3]][['brand', 'model']].str.cat(sep=' ')
+    return described
+
+
+def compare_outputs(cases, start, actual, expected, rtol):
+    """Mismatches between two output dicts: {name: [count, max abs diff, examples]}."""
+    mismatches = {}
+    for name, expected_values in expected.items():
+        equal = _equal(actual[name].astype(float), expected_values.astype(float), rtol)
+        if equal.all():
+            continue
+        bad = np.argwhere(~equal)
+        with np.errstate(invalid='ignore'):
+            diff = np.nanmax(np.abs(actual[name].astype(float) - expected_values.astype(float))[~equal], initial=0)
+        examples = [dict(_case(cases, start, tuple(index)), actual=actual[name][tuple(index)].item(),
+                         expected=expected_values[tuple(index)].item()) for index in bad[:MAX_EXAMPLES]]
+        mismatches[name] = [len(bad), float(diff), examples]
+    return mismatches
+
+
+def check_properties(cases, start, stop, outputs):
+    """Property violations in one chunk's outputs: {property: [count, examples]}."""
+    violations = {}
+
+    def record(name, bad):
+        bad = np.argwhere(bad)
+        if len(bad):
+            violations[name] = [len(bad), [_case(cases, start, tuple(index)) for index in bad[:MAX_EXAMPLES]]]
+
+    bucket = outputs['bucket'].astype(np.int64)
+    found = bucket >= 0
+    swl = outputs['swl'][:, None, None]
+    total = outputs['total_bucket_weight']
+    classes = np.array([excavator_class for _, excavator_class in cases.configs[start:stop]])
+    density = DENSITIES[None, None, :]
+
+    # The suspended load stays within the SWL and matches the chosen bucket
+    with np.errstate(invalid='ignore'):
+        record('swl_exceeded', found & ~(total <= swl))
+    expected_total = FIXED_INPUTS['quick_hitch_weight'] + cases.bucket_sizes[bucket] * density + cases.bucket_weights[bucket]
+    record('suspended_load_inconsistent', found & ~np.isclose(total, expected_total, rtol=1e-12, atol=0))
+
+    # No bigger bucket of the same catalogue would have fitted
+    for select_bhc in (0, 1):
+        first, last = cases.bucket_offsets[select_bhc], cases.bucket_offsets[select_bhc] + len(cases.catalogues[select_bhc])
+        sizes, weights, bucket_classes = (cases.bucket_sizes[first:last], cases.bucket_weights[first:last],
+                                          cases.bucket_classes[first:last])
+        totals = FIXED_INPUTS['quick_hitch_weight'] + sizes[None, None, :] * DENSITIES[None, :, None] + weights
+        with np.errstate(invalid='ignore'):
+            fits = ((totals <= outputs['swl'][:, None, None]) & ~(bucket_classes > classes[:, None, None] + 10) &
+                    (sizes > 0))
+        chosen_size = np.where(found[:, select_bhc], cases.bucket_sizes[bucket[:, select_bhc]], 0)
+        record('bigger_bucket_fits', (fits & (sizes > chosen_size[:, :, None])).any(axis=-1)[:, None, :]
+               & (np.arange(2) == select_bhc)[None, :, None])
+
+    # Bucket size never grows with material density
+    size = np.where(found, cases.bucket_sizes[bucket], 0)
+    record('bucket_grows_with_density', np.concatenate([np.diff(size, axis=-1) > 0,
+                                                        np.zeros(size.shape[:-1] + (1,), dtype=bool)], axis=-1))
+
+    # Truck load: rated payload, or the heaped volume for light material
+    found4 = found[..., None]
+    heaped = cases.heaped[None, None, None, :] * density[..., None]
+    capacity = np.fmin(cases.payloads[None, None, None, :] * 1000, heaped)
+    record('truck_capacity', found4 & (outputs['dump_truck_payload'] != capacity))
+
+    # Pass matching: at most +10%, and an adjusted load lands within 0.05 of a whole pass
+    for side in ('old', 'new'):
+        adjusted = outputs[f'dump_truck_payload_{side}']
+        swings = outputs[f'swings_to_fill_truck_{side}']
+        payload = outputs[f'{side}_payload']
+        with np.errstate(invalid='ignore'):
+            record(f'pass_tolerance_{side}', found4 & ~((adjusted >= capacity) & (adjusted <= capacity * 1.10)))
+            record(f'whole_passes_{side}', found4 & (adjusted != capacity) & ~(np.abs(swings - np.ceil(swings)) <= 0.05))
+            record(f'swings_inconsistent_{side}', found4 & ~np.isclose(swings, adjusted / payload, rtol=1e-12, atol=0))
+    record('productivity_not_finite', found4 & ~np.isfinite(outputs['productivity']))
+    return violations
+
+
+# Golden snapshots
+def golden_path(digest):
+    return os.path.join(GOLDEN_DIR, f'engine-{digest[:16]}.npz')
+
+
+def save_golden(path, cases, outputs):
+    """Save outputs; comparison values are stored once per (bucket, density, truck) since they depend on nothing else."""
+    n_codes = len(cases.bucket_sizes)
+    table = {key: np.full((n_codes, len(DENSITIES), len(cases.payloads)), np.nan) for key in COMPARISON_KEYS}
+    conflicts = 0
+    config, select_bhc, density = np.nonzero(outputs['bucket'] >= 0)
+    codes = outputs['bucket'][config, select_bhc, density]
+    for key in COMPARISON_KEYS:
+        values = outputs[key][config, select_bhc, density]
+        stored = table[key][codes, density]
+        conflicts += int((~np.isnan(stored) & ~_equal(stored, values, 0)).any(axis=-1).sum())
+        table[key][codes, density] = values
+    if conflicts:
+        sys.exit(f"Reference outputs depend on more than bucket, density and truck ({conflicts} conflicts); "
+                 "golden format needs updating")
+    meta = {'digest': cases.digest, 'densities': DENSITIES.tolist(), 'fixed_inputs': FIXED_INPUTS,
+            'configs': len(cases.configs), 'trucks': len(cases.payloads), 'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), swl=outputs['swl'], bucket=outputs['bucket'],
+                        total_bucket_weight=outputs['total_bucket_weight'],
+                        **{f'table_{key}': values for key, values in table.items()})
+
+
+def load_golden(path, cases):
+    with np.load(path, allow_pickle=False) as golden:
+        meta = json.loads(str(golden['meta']))
+        if meta['digest'] != cases.digest:
+            sys.exit(f"{path} was made from different catalogues; run snapshot again")
+        if meta['densities'] != DENSITIES.tolist() or meta['fixed_inputs'] != FIXED_INPUTS:
+            sys.exit(f"{path} was made with a different grid; run snapshot again")
+        return {name: golden[name] for name in golden.files if name != 'meta'}
+
+
+def golden_outputs(golden, start, stop):
+    """Expand the stored golden outputs for configurations start:stop."""
+    bucket = golden['bucket'][start:stop]
+    outputs = {'swl': golden['swl'][start:stop], 'bucket': bucket,
+               'total_bucket_weight': golden['total_bucket_weight'][start:stop]}
+    density = np.broadcast_to(np.arange(len(DENSITIES)), bucket.shape)
+    codes = np.maximum(bucket, 0)
+    for key in COMPARISON_KEYS:
+        values = golden[f'table_{key}'][codes, density]
+        outputs[key] = np.where((bucket >= 0)[..., None], values, np.nan)
+    return outputs
+
+
+# Workers
+def _init_worker(csvs, golden_file, shared_root):
+    global _state
+    cases = Cases(csvs)
+    engines = {'engine': BucketEngine(cases.swl_data, cases.bucket_data, cases.bhc_bucket_data, cases.dump_truck_data)}
+    if shared_root:
+        from shared_catalogue import SharedBucketEngine, attach_catalogue
+        engines['shared'] = SharedBucketEngine(attach_catalogue(shared_root))
+    golden = load_golden(golden_file, cases) if golden_file else None
+    _state = {'cases': cases, 'engines': engines, 'golden': golden}
+
+
+def _outputs(name, start, stop):
+    cases, engines = _state['cases'], _state['engines']
+    if name == 'reference':
+        return reference_outputs(cases, start, stop)
+    if name == 'vectorised':
+        return vectorised_outputs(cases, start, stop, engines['engine'])
+    return engine_outputs(cases, start, stop, engines[name])
+
+
+def snapshot_chunk(start, stop):
+    return start, reference_outputs(_state['cases'], start, stop)
+
+
+def check_chunk(names, start, stop, rtol):
+    """Run each engine over configurations start:stop; returns per-engine mismatches, violations and timings."""
+    cases = _state['cases']
+    if _state['golden'] is not None:
+        expected = golden_outputs(_state['golden'], start, stop)
+    else:
+        expected = reference_outputs(cases, start, stop)
+    report = {}
+    for name in names:
+        began = time.perf_counter()
+        actual = expected if name == 'reference' and _state['golden'] is None else _outputs(name, start, stop)
+        seconds = time.perf_counter() - began
+        report[name] = {'seconds': seconds, 'mismatches': compare_outputs(cases, start, actual, expected, rtol),
+                        'violations': check_properties(cases, start, stop, actual)}
+    return report
+
+
+def _chunks(n, workers):
+    size = max(1, min(-(-n // (workers * 4)), CHUNK_CONFIGS))
+    return [(start, min(start + size, n)) for start in range(0, n, size)]
+
+
+def _pool(workers, initargs):
+    if workers == 0:
+        _init_worker(*initargs)
+        return None
+    return ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs)
+
+
+def _map(pool, func, tasks):
+    if pool is None:
+        return (func(*task) for task in tasks)
+    return pool.map(func, *zip(*tasks))
+
+
+def snapshot(csvs, path, workers):
+    cases = Cases(csvs)
+    path = path or golden_path(cases.digest)
+    start_time = time.monotonic()
+    outputs = empty_outputs(cases, len(cases.configs))
+    pool = _pool(workers, (csvs, None, None))
+    try:
+        for start, chunk in _map(pool, snapshot_chunk, _chunks(len(cases.configs), workers or 1)):
+            for name, values in chunk.items():
+                outputs[name][start:start + len(values)] = values
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    violations = check_properties(cases, 0, len(cases.configs), outputs)
+    save_golden(path, cases, outputs)
+    cases_count = int(np.prod(cases.shape))
+    print(f"Snapshot of {cases_count} cases ({len(cases.configs)} configurations x 2 catalogues x "
+          f"{len(DENSITIES)} densities x {len(cases.payloads)} trucks) written to {path} "
+          f"in {time.monotonic() - start_time:.1f}s")
+    for name, (count, examples) in violations.items():
+        print(f"  reference violates {name} in {count} cases, e.g. {json.dumps(examples[0], default=str)}")
+    return not violations
+
+
+def check(csvs, path, names, workers, rtol):
+    cases = Cases(csvs)
+    path = path or golden_path(cases.digest)
+    if not os.path.exists(path):
+        print(f"No snapshot at {path}; comparing with the reference functions computed now")
+        path = None
+    shared_root = None
+    if 'shared' in names:
+        from shared_catalogue import publish_catalogue
+        shared_root = tempfile.mkdtemp(prefix='verify-catalogue-')
+        publish_catalogue(shared_root, *csvs)
+
+    start_time = time.monotonic()
+    totals = {name: {'seconds': 0.0, 'mismatches': {}, 'violations': Counter(), 'examples': {}} for name in names}
+    pool = _pool(workers, (csvs, path, shared_root))
+    try:
+        tasks = [(names, start, stop, rtol) for start, stop in _chunks(len(cases.configs), workers or 1)]
+        for report in _map(pool, check_chunk, tasks):
+            for name, chunk in report.items():
+                total = totals[name]
+                total['seconds'] += chunk['seconds']
+                for key, (count, diff, examples) in chunk['mismatches'].items():
+                    seen = total['mismatches'].setdefault(key, [0, 0.0, examples])
+                    seen[0] += count
+                    seen[1] = max(seen[1], diff)
+                for key, (count, examples) in chunk['violations'].items():
+                    total['violations'][key] += count
+                    total['examples'].setdefault(key, examples)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if shared_root:
+            shutil.rmtree(shared_root, ignore_errors=True)
+
+    cases_count = int(np.prod(cases.shape))
+    print(f"{cases_count} cases against {'the snapshot ' + path if path else 'the reference'} "
+          f"in {time.monotonic() - start_time:.1f}s")
+    ok = True
+    for name, total in totals.items():
+        failed = total['mismatches'] or total['violations']
+        ok = ok and not failed
+        print(f"  {name:<11} {'FAIL' if failed else 'ok':<5} {total['seconds']:.1f}s of worker time")
+        for key, (count, diff, examples) in sorted(total['mismatches'].items()):
+            print(f"    {key}: {count} mismatches, max abs diff {diff:.3g}, e.g. {json.dumps(examples[0], default=str)}")
+        for key, count in sorted(total['violations'].items()):
+            print(f"    property {key}: {count} violations, e.g. {json.dumps(total['examples'][key][0], default=str)}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['snapshot', 'check'])
+    parser.add_argument('--golden', help=f'snapshot file (default: {GOLDEN_DIR}/engine-<catalogue digest>.npz)')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=ENGINES[:3],
+                        help='engines to check (default: engine vectorised shared)')
+    parser.add_argument('--rtol', type=float, default=0.0,
+                        help='relative tolerance for numeric outputs (default: 0, bit-identical)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU; 0 runs in this process)')
+    parser.add_argument('--csvs', nargs=4, metavar=('SWL', 'BUCKET', 'BHC_BUCKET', 'DUMP_TRUCK'),
+                        default=[SWL_CSV, BUCKET_CSV, BHC_BUCKET_CSV, DUMP_TRUCK_CSV])
+    args = parser.parse_args(argv)
+    workers = os.cpu_count() if args.workers is None else args.workers
+
+    if args.command == 'snapshot':
+        ok = snapshot(args.csvs, args.golden, workers)
+    else:
+        ok = check(args.csvs, args.golden, args.engines, workers, args.rtol)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
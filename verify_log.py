@@ -0,0 +1,94 @@
+"""Check that concurrent writers lose no records while the log is compacted.
+
+Writer processes append distinct calculation records to one log directory
+with a small ``max_bytes``, so the active file rotates every few writes,
+while another process runs ``compact()`` in a loop until they finish. The
+log is then compacted once more and every record must be present exactly
+once. A lost record shows up only when a compaction lands between a
+writer opening the active file and appending to it, so each round is
+repeated ``--rounds`` times.
+
+    python verify_log.py
+    python verify_log.py --writers 4 --records 4000 --rounds 10
+
+Exit status is 1 if any round loses or duplicates a record.
+"""
+
+import argparse
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+
+from request_log import RequestLog
+
+MAX_BYTES = 2048
+
+
+def write_records(log_dir, writer, records):
+    log = RequestLog(log_dir, max_bytes=MAX_BYTES, background=False, max_buffered=2)
+    for i in range(records):
+        log.log_calculation({'writer': writer, 'i': i}, {})
+    log.close()
+
+
+def compact_until(log_dir, stop):
+    log = RequestLog(log_dir, max_bytes=MAX_BYTES, background=False)
+    while not stop.is_set():
+        log.compact()
+    log.close()
+
+
+def run_round(writers, records):
+    """One round in a fresh directory; returns (missing, duplicated)."""
+    log_dir = tempfile.mkdtemp(prefix='verify-log-')
+    try:
+        stop = multiprocessing.Event()
+        compactor = multiprocessing.Process(target=compact_until, args=(log_dir, stop))
+        processes = [multiprocessing.Process(target=write_records, args=(log_dir, writer, records))
+                     for writer in range(writers)]
+        compactor.start()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        stop.set()
+        compactor.join()
+        if compactor.exitcode or any(process.exitcode for process in processes):
+            sys.exit('a writer or the compactor process failed')
+
+        log = RequestLog(log_dir, background=False)
+        log.compact()
+        seen = {}
+        for record in log.scan(events=['calculation']):
+            key = (record['inputs']['writer'], record['inputs']['i'])
+            seen[key] = seen.get(key, 0) + record.get('count', 1)
+        log.close()
+        missing = writers * records - len(seen)
+        duplicated = sum(count - 1 for count in seen.values())
+        return missing, duplicated
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--writers', type=int, default=2, help='writer processes (default: 2)')
+    parser.add_argument('--records', type=int, default=4000, help='records per writer (default: 4000)')
+    parser.add_argument('--rounds', type=int, default=5, help='rounds to run (default: 5)')
+    args = parser.parse_args(argv)
+
+    ok = True
+    for round_number in range(1, args.rounds + 1):
+        start = time.perf_counter()
+        missing, duplicated = run_round(args.writers, args.records)
+        status = 'ok' if not missing and not duplicated else 'FAIL'
+        print(f"round {round_number}: {args.writers * args.records} records, {missing} missing, "
+              f"{duplicated} duplicated ({time.perf_counter() - start:.1f}s) {status}")
+        ok = ok and status == 'ok'
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
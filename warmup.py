@@ -0,0 +1,65 @@
+"""Warm the calculation caches from historical requests at server start.
+
+The most frequent calculation inputs in the request log are replayed
+through ``BucketEngine.calculate`` so the SWL index, bucket selection and
+comparison caches (and the PDF stylesheet) are hot before the first user
+arrives. Warm-up stops as soon as its time budget is spent.
+"""
+
+import os
+import time
+from collections import Counter
+
+from pdf_report import get_pdf_styles
+from request_log import dumps_record
+
+DEFAULT_TOP_N = int(os.environ.get('BUCKET_WARMUP_TOP_N', 100))
+DEFAULT_BUDGET = float(os.environ.get('BUCKET_WARMUP_BUDGET', 5.0))
+
+
+def top_configurations(records, top_n, deadline=None):
+    """Return the ``top_n`` most frequent calculation inputs, most frequent first.
+
+    Compacted records carry a ``count`` and are weighted by it. Counting stops
+    early if ``deadline`` (a time.monotonic() value) passes.
+    """
+    counts = Counter()
+    inputs_by_key = {}
+    for record in records:
+        inputs = record.get('inputs')
+        if not isinstance(inputs, dict):
+            continue
+        key = dumps_record(inputs)
+        counts[key] += record.get('count', 1)
+        inputs_by_key.setdefault(key, inputs)
+        if deadline is not None and time.monotonic() > deadline:
+            break
+    return [inputs_by_key[key] for key, _ in counts.most_common(top_n)]
+
+
+def warm_up(engine, request_log, top_n=DEFAULT_TOP_N, budget=DEFAULT_BUDGET):
+    """Precompute the most common historical calculations within ``budget`` seconds."""
+    start = time.monotonic()
+    deadline = start + budget
+    stats = {'configurations': 0, 'warmed': 0, 'failed': 0, 'seconds': 0.0, 'timed_out': False}
+
+    get_pdf_styles()
+
+    configurations = top_configurations(request_log.scan(events=['calculation']), top_n, deadline)
+    stats['configurations'] = len(configurations)
+
+    for inputs in configurations:
+        if time.monotonic() > deadline:
+            stats['timed_out'] = True
+            break
+        try:
+            engine.calculate(inputs, inputs.get('select_bhc', False))
+            stats['warmed'] += 1
+        except (KeyError, TypeError, ValueError, ZeroDivisionError):
+            # Inputs the app itself can't calculate (e.g. 0 swings/min) or from an older catalogue
+            stats['failed'] += 1
+
+    stats['seconds'] = time.monotonic() - start
+    print(f"Cache warm-up: {stats['warmed']}/{stats['configurations']} configurations in {stats['seconds']:.2f}s"
+          f"{' (time budget reached)' if stats['timed_out'] else ''}")
+    return stats